@@ -0,0 +1,82 @@
+import argparse
+import json
+import multiprocessing
+import signal
+
+from game.simulation import Simulation, TOWER_TYPES
+
+# compiled maps, map images and wave files each worker process already loaded, (level, wave file) -> assets
+_assets = {}
+
+# simulation that builds from assets a worker loaded before instead of reading the files again
+class CachedSimulation(Simulation):
+    def __init__(self, image_name, wave_txt_path, starting_lives, starting_currency, seed=None):
+        key = (image_name, wave_txt_path)
+        if key not in _assets:
+            self.image_name, self.wave_txt_path = key
+            compiled = Simulation.load_compiled_map(self)
+            images = Simulation.load_map_images(self) if compiled == None else None
+            _assets[key] = (compiled, images, Simulation.load_wave_lines(self))
+        self.assets = _assets[key]
+        super().__init__(image_name, wave_txt_path, starting_lives, starting_currency, seed)
+
+    def load_compiled_map(self):
+        return self.assets[0]
+
+    def load_map_images(self):
+        return self.assets[1]
+
+    def load_wave_lines(self):
+        return self.assets[2]
+
+# pygame (SDL) catches SIGTERM to turn it into a quit event, workers forked from a process that started it
+# would keep that and ignore Pool.terminate(), so leaving the pool would hang
+def _init_worker():
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+# runs one job in a worker, jobs are picklable tuples so they can be sent across processes
+def _evaluate(job):
+    index, level, wave_txt_path, towers, lives, currency, seed = job
+    # zombie goals are random, seeding per job keeps results independent of scheduling
+    sim = CachedSimulation(level, wave_txt_path, lives, currency, seed)
+    result = sim.run([(tuple(tile), TOWER_TYPES[name]) for tile, name in towers])
+    result.update({"index": index, "level": level, "waves": wave_txt_path, "towers": towers})
+    return result
+
+# simulates every tower layout against every wave file of a level on a process pool
+# layouts are lists of ((x, y), tower class name), results are yielded as soon as they finish (not in order)
+# a wave file of None plays endless waves
+def evaluate(level, layouts, wave_files=None, starting_lives=25, starting_currency=1000, processes=None, seed=10):
+    if wave_files == None:
+        wave_files = ["maps/" + level + "_waves.txt"]
+
+    jobs = []
+    for wave_txt_path in wave_files:
+        for towers in layouts:
+            jobs.append((len(jobs), level, wave_txt_path, towers, starting_lives, starting_currency, seed))
+
+    with multiprocessing.Pool(processes, _init_worker) as pool:
+        for result in pool.imap_unordered(_evaluate, jobs):
+            yield result
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate tower layouts for a level headlessly on every core.")
+    parser.add_argument("level", help="map name in data/maps, like level3")
+    parser.add_argument("layouts", help='json file with a list of layouts, each a list of [[x, y], "Tower"]')
+    parser.add_argument("--waves", nargs="*", help="wave files relative to data, defaults to the level's own")
+    parser.add_argument("--endless", action="store_true", help="use endless generated waves instead of wave files")
+    parser.add_argument("--lives", type=int, default=25)
+    parser.add_argument("--currency", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.layouts) as file:
+        layouts = json.load(file)
+
+    # one json result per line, printed as they come in
+    wave_files = [None] if args.endless else args.waves
+    for result in evaluate(args.level, layouts, wave_files, args.lives, args.currency, args.processes):
+        print(json.dumps(result), flush=True)
+
+if __name__ == "__main__":
+    main()
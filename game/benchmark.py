@@ -0,0 +1,194 @@
+import os
+# headless, has to be set before pygame starts up
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import pygame
+
+import game.load as load
+import game.entity as entity
+import game.mapfile as mapfile
+from game.map import TileMap, Road, ready_tiles
+from game.simulation import Simulation, TOWER_TYPES, FIXED_TIMESTEP
+from game.profiler import Profiler
+
+# times every level headlessly under the same load and writes the results as json, with --baseline it also
+# compares them against an earlier run and exits with 1 if anything got slower than --tolerance allows
+#     python -m game.benchmark [--baseline benchmark_baseline.json]
+# benchmark_baseline.json is a reference run made with the default options (its "meta" says on what) by
+#     python -m game.benchmark --output benchmark_baseline.json
+# timings depend a lot on the machine, so to check a change make a baseline like that on the same machine
+# before it and compare against that one, and only rewrite the committed one when the expected numbers change
+GAMESPACE = pygame.Rect(0, 0, 1030, 520) # same as game.main, which can't be imported without starting the game up
+WARMUP_STEPS = 300 # zombies get added over these, so they're spread down the path when measuring starts
+
+def find_levels():
+    names = [name[:-len("_bg.png")] for name in os.listdir(load.handle_path("maps")) if name.startswith("level") and name.endswith("_bg.png")]
+    return sorted(names, key=lambda name: int(name[len("level"):]))
+
+# buildable tiles next to a road, closest to the top left first so layouts are the same every run
+def tower_spots(tmap):
+    spots = []
+    for x in range(tmap.xdim):
+        for y in range(tmap.ydim):
+            if not tmap.can_build((x, y)):
+                continue
+            neighbours = [tmap.blocking[nx, ny] for nx, ny in ((x+1, y), (x-1, y), (x, y+1), (x, y-1))]
+            if any(isinstance(tile, Road) for tile in neighbours):
+                spots.append((x, y))
+    return spots
+
+# milliseconds for a TileMap to be built from already loaded images, best of a few tries
+def time_tilemap_build(level, repeats):
+    images = load.image("maps/" + level + "_bg.png"), load.image("maps/" + level + "_blocking.png")
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        TileMap(*images)
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+# same for loading the level's compiled map, None if it doesn't have an up to date one
+def time_compiled_load(level, repeats):
+    data = mapfile.read(level)
+    if data == None:
+        return None
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        mapfile.read_tilemap(data)
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+# the game's panels, drawn fully every frame for the worst case
+def make_ui(screen, sim):
+    from game.ui import TowerInfoPanel, BuyPanel, InfoDisplay, WavesDisplay
+    towers = [towertype(0, 0) for towertype in TOWER_TYPES.values()]
+    return [TowerInfoPanel(screen, sim.towers[0] if sim.towers else None, (1030, 70)),
+            BuyPanel(screen, (0, 520), towers, sim.is_tower_unlocked, load.image("weaponsicon.png"), sim.advanced_weapons_cost),
+            InfoDisplay(screen, (1030, 0)),
+            WavesDisplay(screen, (1030, 600))]
+
+def bench_level(screen, level, zombies_per_type, towers_per_type, frames, repeats):
+    result = {"tilemap_build_ms": time_tilemap_build(level, repeats), "compiled_load_ms": time_compiled_load(level, repeats)}
+
+    sim = Simulation(level, "maps/" + level + "_waves.txt", 10**9, 10**9, seed=0)
+    spots = tower_spots(sim.tmap)
+    for i in range(min(towers_per_type * len(TOWER_TYPES), len(spots))):
+        x, y = spots[i]
+        sim.act(("build", x, y, list(TOWER_TYPES)[i % len(TOWER_TYPES)]))
+
+    ztypes = list(entity.Waves.zombiemap.values())
+    to_add = [(ztypes[i % len(ztypes)], sim.tmap.starts[i % len(sim.tmap.starts)]) for i in range(zombies_per_type * len(ztypes))]
+    for step in range(WARMUP_STEPS):
+        # spawned evenly over the warmup
+        for ztype, start in to_add[len(to_add) * step // WARMUP_STEPS:len(to_add) * (step + 1) // WARMUP_STEPS]:
+            sim.zombies.append(ztype.create(sim, start))
+        sim.recycle_zombies()
+        sim.move_zombies(FIXED_TIMESTEP)
+        sim.fire_towers(FIXED_TIMESTEP)
+
+    width, height = sim.tmap.get_px_size()
+    offset = [GAMESPACE.centerx - width / 2, GAMESPACE.centery - height / 2]
+    panels = make_ui(screen, sim)
+
+    profiler = Profiler(history=frames)
+    for _ in range(frames + 1):
+        profiler.start_frame()
+        sim.recycle_zombies()
+        sim.move_zombies(FIXED_TIMESTEP)
+        profiler.mark("zombie step")
+        sim.fire_towers(FIXED_TIMESTEP)
+        profiler.mark("tower targeting")
+
+        screen.set_clip(GAMESPACE)
+        screen.fill((0, 128, 0))
+        sim.tmap.render(screen, offset, GAMESPACE)
+        for zombie in sim.zombies:
+            zombie.render(screen, offset)
+        screen.set_clip(None)
+        profiler.mark("render")
+
+        panels[2].update(sim.lives, sim.currency)
+        for panel in panels:
+            panel.draw(redraw_all=True)
+        profiler.mark("ui")
+        profiler.count("zombies", len(sim.zombies))
+    profiler.start_frame() # finishes the last one
+
+    result["towers"] = len(sim.towers)
+    result["phases"] = {phase: dict(zip(("p50", "p95", "p99"), profiler.percentiles(phase))) for phase in ["frame"] + profiler.phases}
+    result["zombies"] = profiler.percentiles("zombies")[0]
+    return result
+
+# (name, ms) of everything compared between runs
+def metrics(results):
+    for level, result in results["levels"].items():
+        yield level + " tilemap build", result["tilemap_build_ms"]
+        if result.get("compiled_load_ms") != None:
+            yield level + " compiled load", result["compiled_load_ms"]
+        for phase, values in result["phases"].items():
+            yield level + " " + phase, values["p50"]
+
+# prints how each metric changed against the baseline, returns the ones that got slower than tolerance allows
+def compare(results, baseline, tolerance):
+    old = dict(metrics(baseline))
+    regressions = []
+    for name, ms in metrics(results):
+        if name not in old:
+            print("%-32s %9.3f ms   (not in baseline)" % (name, ms))
+            continue
+        ratio = ms / old[name] if old[name] else 1
+        flag = ""
+        # tiny timings are mostly noise, so they don't count
+        if ratio > 1 + tolerance and ms - old[name] > 0.05:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("%-32s %9.3f ms   baseline %9.3f   x%.2f%s" % (name, ms, old[name], ratio, flag))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark map building, zombie stepping, tower targeting, rendering and UI headlessly.")
+    parser.add_argument("--levels", nargs="*", help="maps to run, defaults to every levelN in data/maps")
+    parser.add_argument("--zombies", type=int, default=50, help="zombies of each type to add")
+    parser.add_argument("--towers", type=int, default=5, help="towers of each type to build")
+    parser.add_argument("--frames", type=int, default=300, help="frames to measure per level")
+    parser.add_argument("--repeats", type=int, default=5, help="tilemap builds to take the best of")
+    parser.add_argument("--output", default="benchmark.json", help="where the results go as json")
+    parser.add_argument("--baseline", help="earlier results to compare against, like benchmark_baseline.json, exits with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="how much slower than the baseline is a regression")
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode([1280, 720])
+    ready_tiles()
+
+    results = {"meta": {"python": platform.python_version(), "pygame": pygame.version.ver,
+                        "numpy": entity.numpy != None, "platform": platform.platform(),
+                        "zombies_per_type": args.zombies, "towers_per_type": args.towers, "frames": args.frames},
+               "levels": {}}
+    for level in args.levels or find_levels():
+        result = bench_level(screen, level, args.zombies, args.towers, args.frames, args.repeats)
+        results["levels"][level] = result
+        print(level, "build %.2f ms," % result["tilemap_build_ms"], "compiled load %s ms," % ("-" if result["compiled_load_ms"] == None else "%.2f" % result["compiled_load_ms"]), result["zombies"], "zombies,", result["towers"], "towers,",
+              ", ".join("%s %.3f ms" % (phase, values["p50"]) for phase, values in result["phases"].items()))
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print("wrote", args.output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(len(regressions), "regressions")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
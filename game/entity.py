@@ -1,37 +1,84 @@
 import random
 import json
+from collections import deque
 
 import pygame
+try:
+    import numpy
+except ImportError: # numpy is optional, without it zombies just step one at a time
+    numpy = None
 
 import game.load as load
 from game.sound import SoundEffectsManager
-from game.map import Road, Start, SCALE
-
-class ZombieBase:
+from game.map import Road, Start, End, SCALE
+
+# recycles objects through a free list per class instead of leaving them to the garbage collector
+# create() reuses a released object by running __init__ on it again, so __init__ has to set up all the state
+class Pooled:
+    __slots__ = ()
+    max_free = 1000
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.free = []
+        cls.fields = tuple(name for klass in cls.__mro__ for name in klass.__dict__.get("__slots__", ()))
+
+    @classmethod
+    def create(cls, *args):
+        if cls.free:
+            obj = cls.free.pop()
+            obj.__init__(*args)
+            return obj
+        return cls(*args)
+
+    # nothing may use the object after it's released
+    # kept objects get every slot cleared, or the pool would keep old games, maps and hordes alive through them
+    def release(self):
+        if len(self.free) < self.max_free:
+            for name in self.fields:
+                setattr(self, name, None)
+            self.free.append(self)
+
+class ZombieBase(Pooled):
+    __slots__ = ("game", "x", "y", "tile", "goal", "dest", "last_render_pos", "health",
+                 "health_bar", "stun_timer", "disp_offset", "horde", "slot", "hook_slot")
     image = None
     speed = 1
     max_health = 200
     reward = 20
     healthbar_off_y = 20
     lives_impact = 1
+    max_health_bar_width = 30
+    health_bars = {} # width in pixels -> bar surface, shared by all zombies
     
     def __init__(self, game, tile):
         self.game = game
         self.x, self.y = tile.x, tile.y
         self.tile = tile
-        self.goal = random.choice(list(self.tile.next.keys()))
+        self.goal = game.random.choice(list(self.tile.next.keys()))
         self.dest = self.tile.next[self.goal][0]
         self.last_render_pos = [0,0]
 
         self.health = self.max_health
-
-        self.max_health_bar_width = 30
         self.update_health_bar()
 
         self.stun_timer = 0
-        self.disp_offset = [random.random()/2-0.25, random.random()/2-0.25]
+        self.disp_offset = [game.random.random()/2-0.25, game.random.random()/2-0.25]
+
+        # set when this zombie's movement is handled by a ZombieHorde
+        self.horde = None
+        self.slot = None
+        self.hook_slot = None
     
     def timestep(self, deltatime):
+        if self.behaviour(deltatime):
+            self.move(deltatime)
+
+    # hook for per type behaviour, returns whether the zombie moves this timestep
+    def behaviour(self, deltatime):
+        return True
+
+    def move(self, deltatime):
         if self.stun_timer > 0:
             self.stun_timer -= deltatime
             return
@@ -48,24 +95,23 @@ class ZombieBase:
             if (dist <= 0): return
             self.x += (self.dest.x - self.x)/dist * self.speed * deltatime
             self.y += (self.dest.y - self.y)/dist * self.speed * deltatime
-    
+
+    # pixel position on the map without the camera offset, needs to be called after moving
+    def update_pos(self):
+        self.last_render_pos = (
+            (self.x + self.disp_offset[0]) * SCALE + (SCALE - self.image.get_width())//2,
+            (self.y + self.disp_offset[1]) * SCALE + (SCALE - self.image.get_height()) - SCALE//3
+        )
+
+    # returns the part of the screen it was drawn over
     def render(self, screen, off = [0,0]):
-        off = [
-            off[0] + (SCALE - self.image.get_width())//2,
-            off[1] + (SCALE - self.image.get_height()) - SCALE//3
-        ]
-        tpos = [
-            self.x + self.disp_offset[0],
-            self.y + self.disp_offset[1]
-        ]
-        self.last_render_pos = (tpos[0]*SCALE + off[0], tpos[1]*SCALE + off[1])
-        screen.blit(self.image, self.last_render_pos)
+        rect = screen.blit(self.image, (self.last_render_pos[0] + off[0], self.last_render_pos[1] + off[1]))
 
-        self.update_health_bar()
         center = self.center_pos()
 
         if self.health < self.max_health:
-            screen.blit(self.health_bar, [center[0] - self.health_bar.get_width() // 2, center[1] - self.healthbar_off_y])
+            rect = rect.union(screen.blit(self.health_bar, [center[0] + off[0] - self.health_bar.get_width() // 2, center[1] + off[1] - self.healthbar_off_y]))
+        return rect
     
     def render_pos(self):
         return self.last_render_pos
@@ -78,27 +124,37 @@ class ZombieBase:
 
     def hit(self, damage):
         self.health -= damage
+        self.update_health_bar()
 
     def is_dead(self):
         return self.health <= 0
 
+    # only needs to be called when health changes
     def update_health_bar(self):
-        self.health_bar = pygame.Surface((self.max_health_bar_width * (self.health / self.max_health), 3))
-        self.health_bar.fill((0, 255, 0))
+        width = max(int(self.max_health_bar_width * (self.health / self.max_health)), 0)
+        if width not in ZombieBase.health_bars:
+            ZombieBase.health_bars[width] = pygame.Surface((width, 3))
+            ZombieBase.health_bars[width].fill((0, 255, 0))
+        self.health_bar = ZombieBase.health_bars[width]
 
     def stun(self, duration):
         self.stun_timer = duration
+        if self.horde:
+            self.horde.stun[self.slot] = duration
 
 class Zombie(ZombieBase):
+    __slots__ = ()
     image = load.image("smallzombie.png")
     speed = 1
 
 class FastZombie(ZombieBase):
+    __slots__ = ()
     image = load.image("fastzombie.png")
     speed = 1.75
     reward = 25
 
 class GiantZombie(ZombieBase):
+    __slots__ = ()
     image = load.image("buffzombie.png")
     speed = 0.6
     max_health = 2000
@@ -107,12 +163,14 @@ class GiantZombie(ZombieBase):
     lives_impact = 5
 
 class BabyZombie(ZombieBase):
+    __slots__ = ()
     image = load.image("babyzombie.png")
     speed = 2.5
     max_health = 100
     reward = 30
 
 class ShieldZombie(ZombieBase):
+    __slots__ = ("shield",)
     image = load.image("smallzombie.png")
     shieldimage = load.image("shield.png")
     speed = 1
@@ -129,18 +187,20 @@ class ShieldZombie(ZombieBase):
         if self.shield > 0:
             self.shield -= damage
         else:
-            self.health -= damage
+            super().hit(damage)
     
     def render(self, screen, off = [0,0]):
-        super().render(screen, off)
+        rect = super().render(screen, off)
         if self.shield > 0:
-            screen.blit(self.shieldimage, [
-                self.last_render_pos[0] + self.image.get_width()//3,
-                self.last_render_pos[1] + self.image.get_height()//3
-            ])
+            rect = rect.union(screen.blit(self.shieldimage, [
+                self.last_render_pos[0] + off[0] + self.image.get_width()//3,
+                self.last_render_pos[1] + off[1] + self.image.get_height()//3
+            ]))
+        return rect
 
 
 class SummonerZombie(ZombieBase):
+    __slots__ = ("last_spawn", "spawns")
     image = load.image("smartzombie.png")
     max_health = 500
     speed = 0.5
@@ -155,15 +215,15 @@ class SummonerZombie(ZombieBase):
         self.last_spawn = self.spawn_rate
         self.spawns = self.spawn_group
     
-    def timestep(self, deltatime):
+    def behaviour(self, deltatime):
         if self.last_spawn > 0:
             self.last_spawn -= deltatime
-            if self.last_spawn > 0.5 and self.spawn_rate - self.last_spawn > 0.5:
-                super().timestep(deltatime)
+            return self.last_spawn > 0.5 and self.spawn_rate - self.last_spawn > 0.5
         else:
-            zomb = self.spawntype(self.game, self.tile)
+            zomb = self.spawntype.create(self.game, self.tile)
             zomb.x = self.x
             zomb.y = self.y
+            zomb.update_pos()
             self.game.zombies.append(zomb)
             self.spawns -= 1
             if self.spawns > 0:
@@ -171,9 +231,11 @@ class SummonerZombie(ZombieBase):
             else:
                 self.spawns = self.spawn_group
                 self.last_spawn = self.spawn_rate
+            return False
 
 
 class CarryZombie(ZombieBase):
+    __slots__ = ()
     image = load.image("cart.png")
     max_health = 1000
     speed = 0.65
@@ -185,9 +247,11 @@ class CarryZombie(ZombieBase):
     def hit(self, damage):
         if self.health > 0 and self.health < damage:
             for i in range(self.spawn_group):
-                zomb = self.spawntype(self.game, self.tile)
+                zomb = self.spawntype.create(self.game, self.tile)
                 zomb.x = self.x
                 zomb.y = self.y
+                # hits come after the zombies moved this step, so nothing else places it before it's drawn
+                zomb.update_pos()
                 self.game.zombies.append(zomb)
         super().hit(damage)
 
@@ -201,40 +265,46 @@ class Waves:
                  "summoner": SummonerZombie,
                  "carry": CarryZombie}
 
-    def __init__(self, game, filepath, tmap):
+    # lines can be passed in already read (see read_lines) so the file isn't opened again
+    def __init__(self, game, filepath, tmap, lines=None):
         self.game = game
-        filepath = load.handle_path(filepath)
+        if lines == None:
+            lines = Waves.read_lines(filepath)
 
-        with open(filepath, "r") as file:
-            lines = file.readlines()
+        self.tmap = tmap
 
-        lines = [json.loads(line) for line in lines]
-        waves = []
-    
+        # each wave is a list of runs for each spawnpoint, a run is (zombie type, count)
+        waves = deque()
         for wave in lines:
             waves.append([])
             for spawnwave in wave:
                 waves[-1].append([])
                 for i in range(0, len(spawnwave), 2):
-                    for _ in range(spawnwave[i+1]):
-                        waves[-1][-1].append(Waves.zombiemap[spawnwave[i]])
+                    if spawnwave[i+1] > 0:
+                        waves[-1][-1].append((Waves.zombiemap[spawnwave[i]], spawnwave[i+1]))
                     
         self.waves = waves
         for i, spawnwave in enumerate(waves):
             if len(spawnwave) > len(tmap.starts):
                 print("WARNING: This wave file has too many spawnpoints on wave " + str(i+1))
         
-        self.zombies_to_spawn = [[] for _ in range(len(tmap.starts))]
+        # runs still to spawn at each spawnpoint as [zombie type, count left], zombies only get made as they spawn
+        self.zombies_to_spawn = [deque() for _ in range(len(tmap.starts))]
         self.spawn_timers = [0 for _ in range(len(self.zombies_to_spawn))]
         self.spawn_last = [type(None) for _ in range(len(self.zombies_to_spawn))]
         self.time_threshold = 1
         self.total_waves = len(waves)
         self.current_wave = 0
 
+    @staticmethod
+    def read_lines(filepath):
+        with open(load.handle_path(filepath), "r") as file:
+            return [json.loads(line) for line in file.readlines()]
+
     def get_next(self):
         if self.waves:
             self.current_wave += 1
-            return self.waves.pop(0)
+            return self.waves.popleft()
         return False
 
     def get_finished(self):
@@ -246,28 +316,256 @@ class Waves:
 
         if wave:
             for i in range(len(wave)):
-                spawnwave = wave[i]
-                for ztype in spawnwave:
-                    self.zombies_to_spawn[i].append(ztype(self.game, tmap.starts[i]))
-
-    def update(self, zombielist):
+                for ztype, count in wave[i]:
+                    self.zombies_to_spawn[i].append([ztype, count])
+
+    # makes the next zombie at spawnpoint i
+    def spawn(self, i):
+        run = self.zombies_to_spawn[i][0]
+        run[1] -= 1
+        if run[1] == 0:
+            self.zombies_to_spawn[i].popleft()
+        return run[0].create(self.game, self.tmap.starts[i])
+
+    def update(self, zombielist, deltatime):
         for i in range(len(self.spawn_timers)):
-            self.spawn_timers[i] += Waves.loop.get_ticktime()
+            self.spawn_timers[i] += deltatime
 
             if self.zombies_to_spawn[i]:
                 normal = self.spawn_timers[i] > self.time_threshold
                 micro_wave = self.spawn_timers[i] > self.time_threshold / 2
-                micro_wave = micro_wave and isinstance(self.zombies_to_spawn[i][0], self.spawn_last[i])
+                micro_wave = micro_wave and issubclass(self.zombies_to_spawn[i][0][0], self.spawn_last[i])
 
                 if normal or micro_wave:
                     self.spawn_timers[i] = 0
-                    zombielist.append(self.zombies_to_spawn[i].pop(0))
+                    zombielist.append(self.spawn(i))
                     self.spawn_last[i] = type(zombielist[i])
 
     def get_progress(self): # returns (current_wave, total_waves)
         return self.current_wave, self.total_waves
 
-class ProjectileBase:
+# waves that never run out, each one is made up when it's called from a budget that keeps growing
+# zombie types cost their threat() out of the budget, so later waves get both more and tougher zombies
+class EndlessWaves(Waves):
+    def __init__(self, game, tmap, base_budget=8, growth=1.2, seed=None):
+        super().__init__(game, None, tmap, lines=[])
+        self.total_waves = None
+        self.base_budget = base_budget
+        self.growth = growth
+        # own generator so waves come out the same however many zombies spawn, seeded from the game's by default
+        self.random = random.Random(game.random.getrandbits(32) if seed == None else seed)
+        self.threats = {ztype: EndlessWaves.threat(ztype) for ztype in Waves.zombiemap.values()}
+
+    # roughly how many plain zombies a zombie type is worth
+    @staticmethod
+    def threat(ztype):
+        health = (ztype.max_health + getattr(ztype, "shield_health", 0)) / ZombieBase.max_health
+        speed = ztype.speed / ZombieBase.speed
+        # zombies that pay out more make the waves after them easier
+        cost = health * speed ** 0.5 * ztype.lives_impact ** 0.25 * (ZombieBase.reward / ztype.reward) ** 0.25
+        if hasattr(ztype, "spawntype"):
+            cost += ztype.spawn_group * EndlessWaves.threat(ztype.spawntype)
+        return cost
+
+    def get_finished(self):
+        return False
+
+    def get_next(self):
+        self.current_wave += 1
+        return self.generate(self.current_wave)
+
+    # returns the runs for each spawnpoint, same as a wave read from a file
+    def generate(self, n):
+        budget = self.base_budget * self.growth ** (n - 1)
+        share = budget / len(self.tmap.starts)
+        # a type only shows up once the whole wave can afford a few of them
+        allowed = [ztype for ztype, threat in self.threats.items() if threat * 4 <= budget]
+        cheapest = min(allowed or self.threats, key=self.threats.get)
+
+        wave = []
+        for _ in self.tmap.starts:
+            left = share
+            runs = []
+            while True:
+                options = [ztype for ztype in allowed if self.threats[ztype] <= left]
+                if not options:
+                    # maps with lots of spawnpoints would otherwise leave some of them empty early on
+                    if runs:
+                        break
+                    options = [cheapest]
+                ztype = self.random.choice(options)
+                most = int(left // self.threats[ztype])
+                # big budgets go into a few big runs instead of lots of tiny ones
+                count = self.random.randint(max(1, most // 4), max(1, most // 2))
+                if runs and runs[-1][0] == ztype:
+                    runs[-1] = (ztype, runs[-1][1] + count)
+                else:
+                    runs.append((ztype, count))
+                left -= count * self.threats[ztype]
+            wave.append(runs)
+        return wave
+
+# uniform grid of zombies by map pixel position, so towers only look at zombies near them
+class ZombieGrid:
+    cell_size = SCALE * 2
+
+    def __init__(self):
+        self.cells = {}
+
+    # rebuilt every step after zombies move, zombies are kept with their place in the list
+    def rebuild(self, zombies):
+        self.cells.clear()
+        for i, z in enumerate(zombies):
+            pos = z.center_pos()
+            key = (int(pos[0] // self.cell_size), int(pos[1] // self.cell_size))
+            if key in self.cells:
+                self.cells[key].append((i, z))
+            else:
+                self.cells[key] = [(i, z)]
+
+    # returns living zombies within radius of pos, in the order they were in the list
+    # so ties when picking a target go to whoever spawned first, same as going through the whole list
+    def query(self, pos, radius):
+        in_range = []
+        for cx in range(int((pos[0] - radius) // self.cell_size), int((pos[0] + radius) // self.cell_size) + 1):
+            for cy in range(int((pos[1] - radius) // self.cell_size), int((pos[1] + radius) // self.cell_size) + 1):
+                for i, z in self.cells.get((cx, cy), ()):
+                    z_pos = z.center_pos()
+                    if (z_pos[0] - pos[0]) ** 2 + (z_pos[1] - pos[1]) ** 2 <= radius ** 2 and not z.is_dead():
+                        in_range.append((i, z))
+        in_range.sort(key=lambda entry: entry[0])
+        return [z for i, z in in_range]
+
+# struct of arrays store that moves every zombie in one numpy pass
+# zombie objects stay around for rendering and hits, positions get written back to them after each step
+# health isn't in here on purpose: damage comes one shot at a time from fire_towers and goes through each
+# zombie's own hit (shields, carriers dropping babies), so the zombies keep it and there's no per step damage
+# to batch. add and the write back still go zombie by zombie, they're per spawn and one zip over the arrays
+class ZombieHorde:
+    available = numpy is not None
+
+    def __init__(self, tmap):
+        # every road and end tile gets an id, paths become next tile id lookups per goal
+        self.tiles = []
+        for layer in (tmap.map, tmap.blocking):
+            for tile in layer.unique_tiles():
+                if isinstance(tile, (Road, End)):
+                    tile.path_id = len(self.tiles)
+                    self.tiles.append(tile)
+        self.goals = [tile for tile in self.tiles if type(tile) == End]
+
+        self.tile_x = numpy.array([tile.x for tile in self.tiles], dtype=float)
+        self.tile_y = numpy.array([tile.y for tile in self.tiles], dtype=float)
+        self.on_road = numpy.array([type(tile) in (Road, Start) for tile in self.tiles], dtype=bool)
+        self.next_tile = numpy.full((max(len(self.goals), 1), max(len(self.tiles), 1)), -1, dtype=int)
+        for t, tile in enumerate(self.tiles):
+            for goal, (nexttile, dist) in getattr(tile, "next", {}).items():
+                self.next_tile[self.goals.index(goal), t] = nexttile.path_id
+
+        self.zombies = []
+        self.hooked = [] # zombies with their own behaviour, in the order they were added
+        self.x = numpy.zeros(0)
+        self.y = numpy.zeros(0)
+        self.speed = numpy.zeros(0)
+        self.stun = numpy.zeros(0)
+        self.tile = numpy.zeros(0, dtype=int)
+        self.dest = numpy.zeros(0, dtype=int)
+        self.goal = numpy.zeros(0, dtype=int)
+        self.moves = numpy.zeros(0, dtype=bool)
+
+    def add(self, zombie):
+        n = len(self.zombies)
+        if n == len(self.x):
+            size = max(n * 2, 64)
+            for name in ("x", "y", "speed", "stun", "tile", "dest", "goal", "moves"):
+                arr = getattr(self, name)
+                grown = numpy.zeros(size, dtype=arr.dtype)
+                grown[:n] = arr
+                setattr(self, name, grown)
+
+        zombie.horde, zombie.slot = self, n
+        self.zombies.append(zombie)
+        self.x[n], self.y[n] = zombie.x, zombie.y
+        self.speed[n] = zombie.speed
+        self.stun[n] = zombie.stun_timer
+        self.tile[n] = zombie.tile.path_id
+        self.dest[n] = zombie.dest.path_id
+        self.goal[n] = self.goals.index(zombie.goal)
+        if type(zombie).behaviour is not ZombieBase.behaviour:
+            zombie.hook_slot = len(self.hooked)
+            self.hooked.append(zombie)
+
+    # swaps the last zombie into the freed slot so the arrays stay packed
+    def remove(self, zombie):
+        n = len(self.zombies) - 1
+        slot = zombie.slot
+        last = self.zombies.pop()
+        if last is not zombie:
+            self.zombies[slot] = last
+            last.slot = slot
+            for arr in (self.x, self.y, self.speed, self.stun, self.tile, self.dest, self.goal):
+                arr[slot] = arr[n]
+        # left as a gap so the other hooks keep their order (spawns from them use game.random), packed next timestep
+        if zombie.hook_slot != None:
+            self.hooked[zombie.hook_slot] = None
+        zombie.horde, zombie.slot, zombie.hook_slot = None, None, None
+
+    # same rules as ZombieBase.timestep, for every zombie in the game at once
+    def timestep(self, zombies, deltatime):
+        for zombie in zombies:
+            if zombie.horde == None:
+                self.add(zombie)
+        self.moves[:len(self.zombies)] = True
+        self.hooked = [zombie for zombie in self.hooked if zombie != None]
+        for i, zombie in enumerate(self.hooked):
+            zombie.hook_slot = i
+        for zombie in list(self.hooked):
+            self.moves[zombie.slot] = zombie.behaviour(deltatime)
+        # zombies spawned by hooks still get their first step, like when they're appended mid loop
+        for zombie in zombies:
+            if zombie.horde == None:
+                self.add(zombie)
+                self.moves[zombie.slot] = zombie.behaviour(deltatime)
+
+        n = len(self.zombies)
+        if n == 0:
+            return
+        x, y, speed, stun = self.x[:n], self.y[:n], self.speed[:n], self.stun[:n]
+        tile, dest, goal, moves = self.tile[:n], self.dest[:n], self.goal[:n], self.moves[:n]
+
+        stunned = moves & (stun > 0)
+        stun[stunned] -= deltatime
+        active = moves & ~stunned & self.on_road[tile]
+
+        thresh = deltatime * speed
+        arrived = active & (numpy.abs(x - self.tile_x[dest]) < thresh) & (numpy.abs(y - self.tile_y[dest]) < thresh)
+        tile[arrived] = dest[arrived]
+        finished = arrived & ~self.on_road[tile]
+        hopped = numpy.flatnonzero(arrived & ~finished)
+        dest[hopped] = self.next_tile[goal[hopped], tile[hopped]]
+        lost = hopped[dest[hopped] < 0]
+        if len(lost):
+            # a road with no way to the zombie's end, ZombieBase.move gets a KeyError from tile.next there too
+            raise KeyError(self.goals[goal[lost[0]]])
+
+        walking = active & ~finished
+        dx = self.tile_x[dest] - x
+        dy = self.tile_y[dest] - y
+        dist = numpy.sqrt(dx ** 2 + dy ** 2)
+        walking &= dist > 0
+        x[walking] += dx[walking] / dist[walking] * speed[walking] * deltatime
+        y[walking] += dy[walking] / dist[walking] * speed[walking] * deltatime
+
+        for zombie, zx, zy, zstun in zip(self.zombies, x.tolist(), y.tolist(), stun.tolist()):
+            zombie.x, zombie.y, zombie.stun_timer = zx, zy, zstun
+        for i in hopped.tolist():
+            self.zombies[i].tile = self.tiles[tile[i]]
+            self.zombies[i].dest = self.tiles[dest[i]]
+        for i in numpy.flatnonzero(finished).tolist():
+            self.zombies[i].tile = None
+
+class ProjectileBase(Pooled):
+    __slots__ = ()
     image = None
     lifetime = 1
 
@@ -281,6 +579,8 @@ class ProjectileBase:
         return self.lifetime <= 0
 
 class BulletTrail(ProjectileBase):
+    __slots__ = ("start", "end", "color", "lifetime")
+
     def __init__(self, start, end, color, lifetime=0.1):
         self.start = start
         self.end = end
@@ -288,5 +588,5 @@ class BulletTrail(ProjectileBase):
         self.lifetime = lifetime
 
     def render(self, screen, offset):
-        pygame.draw.line(screen, self.color, [self.start[0] + offset[0], self.start[1] + offset[1]], [self.end[0] + offset[0], self.end[1] + offset[1]], width=1)
+        return pygame.draw.line(screen, self.color, [self.start[0] + offset[0], self.start[1] + offset[1]], [self.end[0] + offset[0], self.end[1] + offset[1]], width=1)
     
@@ -1,17 +1,49 @@
+import hashlib
 import os
 
 import pygame
 
 PATH = "data"
+CACHE_PATH = os.path.join(PATH, "cache")
+
+_images = {}
+_derived = {}
 
 def handle_path(filepath):
     filepath = os.path.split(filepath)
     filepath = os.path.join(PATH, *filepath)
     return filepath
 
-def image(filepath):
-    filepath = handle_path(filepath)
-    return pygame.image.load(filepath)
+# surfaces are loaded once per path and shared, so don't draw onto what this returns
+def image(filepath, alpha=False):
+    key = (filepath, alpha)
+    if key not in _images:
+        surf = pygame.image.load(handle_path(filepath))
+        _images[key] = surf.convert_alpha() if alpha else surf
+    return _images[key]
+
+# a sprite made out of an image file by make(surface), recipe has to describe what make does
+# results are saved to the cache folder under a hash of the source file and recipe, so warm starts skip the pixel work
+def derived(filepath, recipe, make):
+    key = (filepath, recipe)
+    if key not in _derived:
+        with open(handle_path(filepath), "rb") as file:
+            digest = hashlib.sha1(file.read() + repr(recipe).encode()).hexdigest()
+        cached = os.path.join(CACHE_PATH, digest + ".png")
+
+        if os.path.exists(cached):
+            _derived[key] = pygame.image.load(cached)
+        else:
+            _derived[key] = make(image(filepath))
+            try:
+                os.makedirs(CACHE_PATH, exist_ok=True)
+                pygame.image.save(_derived[key], cached)
+            except (OSError, pygame.error): # can't write there, just don't cache it
+                pass
+    return _derived[key]
+
+def scaled(filepath, size):
+    return derived(filepath, ("scale", tuple(size)), lambda surf: pygame.transform.scale(surf, size))
 
 def sound(filepath):
     filepath = handle_path(filepath)
@@ -2,6 +2,7 @@ from abc import ABC
 import math
 import random
 import json
+import threading
 
 import pygame
 
@@ -10,10 +11,16 @@ from game.map import TileMap, Start, Road, ready_tiles, Tower, FastTower, Sniper
 from game.utils import Text, TextButton, LinedText
 from game.sound import MusicManager, SoundEffectsManager
 from game.ui import TowerInfoPanel, BuyPanel, LevelSelectButton, InfoDisplay, WavesDisplay
+from game.simulation import Simulation, FIXED_TIMESTEP
+from game.replay import Replay
+from game.profiler import Profiler
 import game.entity as entity
+import game.mapfile as mapfile
 
 OVERLAY_COLOR = (130,130,130,155)
+BACKGROUND_COLOR = (0,128,0)
 GAMESPACE = pygame.Rect(0, 0, 1030, 520)
+MAX_DIRTY_RECTS = 300 # past this many the whole map gets updated, it's cheaper than that many small ones
 
 class Loop:
     def __init__(self, screen, scene, scenedict, musicManager):
@@ -26,32 +33,60 @@ class Loop:
         self.events = []
         self.requested_cursor = None
         self.ticktime = 0
-        self.fps_text = Text("", [10,10], color=(0,0,0))
+        self.redraw_all = True # whether the whole screen gets drawn and flipped this frame
+        self.dirty_rects = [] # otherwise only these parts of the screen get updated
+        self.profiler = Profiler() # F3 shows it, F4 exports it
+        self.drawn_scene = None # scene that drew the last frame
 
     def start(self):
         while True:
-            self.events.clear()
-            self.requested_cursor = None
-            for event in pygame.event.get():
-                if (event.type == pygame.QUIT
-                or (event.type == pygame.KEYDOWN and event.key == pygame.K_q
-                and pygame.key.get_mods() & pygame.KMOD_CTRL)):
-                    self.end_game()
-                self.events.append(event)
-
-            self.screen.fill((0,128,0))
-
-            # this is where the magic happens
-            self.scene.update(self)
-            self.musicManager.update(self)
-
-            self.handle_cursor()
-            #self.fps_text.update_text(str(round(self.clock.get_fps())))
-            #self.fps_text.draw(self.screen)
-            
+            self.frame()
+
+    def frame(self):
+        self.profiler.start_frame()
+        self.events.clear()
+        self.requested_cursor = None
+        for event in pygame.event.get():
+            if (event.type == pygame.QUIT
+            or (event.type == pygame.KEYDOWN and event.key == pygame.K_q
+            and pygame.key.get_mods() & pygame.KMOD_CTRL)):
+                self.end_game()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.profiler.visible = not self.profiler.visible
+                # scenes that track what they change would leave the overlay on the screen, so they draw it all again
+                if not self.profiler.visible:
+                    self.drawn_scene = None
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                self.profiler.export()
+            self.events.append(event)
+
+        # scenes that track what they change only get a fresh screen when they're switched to, or the overlay's hidden
+        self.redraw_all = not (self.scene.tracks_dirty and self.scene is self.drawn_scene)
+        self.dirty_rects.clear()
+        if self.redraw_all:
+            self.screen.fill(BACKGROUND_COLOR)
+        self.drawn_scene = self.scene
+        self.profiler.mark("events")
+
+        # this is where the magic happens
+        self.scene.update(self)
+        self.profiler.mark("scene") # what's left of it after the phases the scene marked itself
+        self.musicManager.update(self)
+
+        self.handle_cursor()
+        if self.profiler.visible:
+            self.mark_dirty(self.profiler.draw(self.screen))
+        self.profiler.mark("loop")
+        
+        if self.redraw_all:
             pygame.display.flip()
-            self.ticktime = self.clock.tick(144) / 1000
-            self.ticktime = min(self.ticktime, 0.1)
+        else:
+            self.profiler.count("dirty rects", len(self.dirty_rects))
+            pygame.display.update(self.dirty_rects)
+        self.profiler.mark("display")
+        self.ticktime = self.clock.tick(144) / 1000
+        self.profiler.mark("wait")
+        self.ticktime = min(self.ticktime, 0.1)
 
     def switch_scene(self, new_scene):
         # new_scene is a Scene subclass or a string key
@@ -82,42 +117,46 @@ class Loop:
     def get_ticktime(self):
         return self.ticktime
 
+    # for scenes that track what they change, None is ignored
+    def mark_dirty(self, rect):
+        if rect:
+            self.dirty_rects.append(rect)
+
             
 class Scene(ABC):
+    tracks_dirty = False # if True the scene reports what it drew with loop.mark_dirty and the rest of the screen is left alone
+
     def __init__(self, screen):
         self.screen = screen
 
     def update(self, loop):
         pass
 
-class Game(Scene):
-    def __init__(self, screen, image_name, wave_txt_path, starting_lives, starting_currency):
+class Game(Scene, Simulation):
+    tracks_dirty = True
+    speeds = [1, 2, 4, 8] # fast forward options, F or the button next to the wave counter goes through them
+
+    def __init__(self, screen, image_name, wave_txt_path, starting_lives, starting_currency, seed=None, files=None):
+        self.files = files # (compiled map, wave lines) LevelInfo already read, None to read them here
+        Simulation.__init__(self, image_name, wave_txt_path, starting_lives, starting_currency, seed)
         self.id = "game"
         self.screen = screen
-        self.image_name = image_name
-        self.wave_txt_path = wave_txt_path
-        self.starting_lives = starting_lives
-        self.starting_currency = starting_currency
 
         self.description = ""
 
-        bg_image_path = "maps/" + self.image_name + "_bg.png"
-        blocking_image_path = "maps/" + self.image_name + "_blocking.png"
-        self.tmap = TileMap(load.image(bg_image_path), load.image(blocking_image_path))
-        self.waves = entity.Waves(self, self.wave_txt_path, self.tmap)
         self.waves_display = WavesDisplay(self.screen, (1030, 600))
 
         CENTER_AT = [515, 260]
         width, height = self.tmap.get_px_size()
         self.tmap_offset = [CENTER_AT[0]-width/2, CENTER_AT[1]-height/2]
         
-        self.zombies = []
-
-        self.towers = []
         self.projectiles = []
-
-        self.lives = self.starting_lives
-        self.currency = self.starting_currency
+        self.drawn_rects = [] # where sprites went on the map last frame, they need updating again once they move off
+        self.drawn_offset = None # camera the map was last drawn with
+        self.speed = 1 # simulated seconds per real second
+        self.step_time = 0 # simulated time not stepped yet
+        self.step_sounds = set() # sounds from this frame's steps, each only played once however many steps there were
+        self.playback_end = None # step a replay being played back ends at
 
         self.info_display = InfoDisplay(self.screen, (1030, 0))
 
@@ -126,49 +165,95 @@ class Game(Scene):
 
         self.build_mode = False
         self.towertypes = [Tower, FastTower, SniperTower, StunTower]
-        self.is_tower_unlocked = [True, True, False, False]
         self.selected_towertype = Tower
-        self.advanced_weapons_cost = 400
         self.buy_panel = BuyPanel(self.screen, (0, 520), [Tower(0,0), FastTower(0,0), SniperTower(0,0), StunTower(0,0)], self.is_tower_unlocked, load.image("weaponsicon.png"), self.advanced_weapons_cost)
 
         self.endWinTime = None
         self.endLoseTime = None
-        self.time = 0
 
-    # resetting the level after a loss so it can be played again
-    def reset(self):
-        bg_image_path = "maps/" + self.image_name + "_bg.png"
-        blocking_image_path = "maps/" + self.image_name + "_blocking.png"
-        self.tmap = TileMap(load.image(bg_image_path), load.image(blocking_image_path))
-        self.waves = entity.Waves(self, self.wave_txt_path, self.tmap)
+    def load_compiled_map(self):
+        if self.files != None:
+            return self.files[0]
+        return Simulation.load_compiled_map(self)
 
-        self.zombies = []
+    def load_wave_lines(self):
+        if self.files != None:
+            return self.files[1]
+        return Simulation.load_wave_lines(self)
 
-        self.towers = []
+    # resetting the level after a loss so it can be played again
+    def reset(self):
+        self.load_level()
         self.projectiles = []
-
-        self.lives = self.starting_lives
-        self.currency = self.starting_currency
+        self.speed = 1
+        self.step_time = 0
 
         self.selected_tower = None
         self.build_mode = False
-        self.is_tower_unlocked = [True, True, False, False]
         self.buy_panel = BuyPanel(self.screen, (0, 520), [Tower(0,0), FastTower(0,0), SniperTower(0,0), StunTower(0,0)], self.is_tower_unlocked, load.image("weaponsicon.png"), self.advanced_weapons_cost)
 
         self.endWinTime = None
         self.endLoseTime = None
-        self.time = 0
 
+    # plays back a recorded session instead of taking input, speed is how many times faster than real time
+    def start_playback(self, replay, speed=1):
+        self.playback = replay.actions
+        self.playback_end = replay.steps
+        self.speed = speed
+
+    # actions from input, ignored while a replay is playing
+    def player_act(self, action):
+        if self.playback != None:
+            return False
+        return self.act(action)
+
+    def save_replay(self):
+        if self.playback == None:
+            print("saved replay to", Replay.from_simulation(self).save())
+
+    # one fixed step of the simulation, with the sounds and bullet trails that come out of it
+    def play_step(self, loop):
+        reached_end, shots = self.step(FIXED_TIMESTEP, loop.profiler)
+        sounds = loop.soundManager
+
+        if reached_end:
+            self.step_sounds.add(sounds.playZombieEndSound)
+
+        for tower, target in shots:
+            # projectiles are in map pixels so they move with offset
+            self.projectiles.append(entity.BulletTrail.create(tower.center_pos([0,0]), target.center_pos(), tower.bullet_color, tower.bullet_duration))
+
+            if isinstance(tower, StunTower):
+                self.step_sounds.add(sounds.playTaserSound)
+
+            if isinstance(tower, Tower):
+                self.step_sounds.add(sounds.playBulletSound)
+
+            if isinstance(tower, FastTower):
+                self.step_sounds.add(sounds.playBulletSound)
+
+            if isinstance(tower, SniperTower):
+                self.step_sounds.add(sounds.playSniperSound)
+
+            if target.is_dead():
+                self.step_sounds.add(sounds.playZombieDeathSound)
+
+    def cycle_speed(self):
+        self.speed = self.speeds[(self.speeds.index(self.speed) + 1) % len(self.speeds)] if self.speed in self.speeds else 1
     
     def update(self, loop):
+        profiler = loop.profiler
         deltatime = loop.get_ticktime()
-        self.time += deltatime
         
         for event in loop.get_events():
             if event.type == pygame.KEYDOWN:
                 # cheats
                 if event.key == pygame.K_g:
-                    self.currency += 100
+                    self.player_act(("goodwill", 100))
+                if event.key == pygame.K_F5:
+                    self.save_replay()
+                if event.key == pygame.K_f and self.playback == None:
+                    self.cycle_speed()
 
         camera_freedom = (150, 150) # how far the camera can go outside the tilemap
         scrolling_speed = 500 # how fast camera moves
@@ -185,10 +270,14 @@ class Game(Scene):
         down = pressed[pygame.K_DOWN] or pressed[pygame.K_s]
         if down and self.tmap_offset[1] > -(self.tmap.ydim * self.tmap.SCALE - 520) - camera_freedom[1]:
             self.tmap_offset[1] -= loop.get_ticktime() * scrolling_speed
+        profiler.mark("input")
 
-        self.waves.update(self.zombies)
-          
-        self.tmap.render(self.screen, self.tmap_offset)
+        # everything on the map is clipped to it, so the panels around it can stay as they are
+        self.screen.set_clip(GAMESPACE)
+        self.screen.fill(BACKGROUND_COLOR)
+        profiler.count("map blits", self.tmap.render(self.screen, self.tmap_offset, GAMESPACE))
+        drawn = [tower.screen_rect(self.tmap_offset) for tower in self.towers] # turrets turn when they fire
+        profiler.mark("tilemap")
 
         tile = self.tmap.screen_to_tile_coords(pygame.mouse.get_pos())
         tile = tile if GAMESPACE.collidepoint(pygame.mouse.get_pos()) else False
@@ -197,21 +286,16 @@ class Game(Scene):
             for event in loop.get_events():
                 if event.type == pygame.MOUSEBUTTONDOWN and not getattr(event, "used", False) and event.button == 1:
                     # building/selecting towers
-                    if isinstance(self.tmap.blocking[tile[0]][tile[1]], Tower):
+                    if isinstance(self.tmap.blocking[tile], Tower):
                         self.build_mode = False
-                        self.selected_tower = self.tmap.blocking[tile[0]][tile[1]]
+                        self.selected_tower = self.tmap.blocking[tile]
                     elif not self.tower_info_panel.get_rect().collidepoint(event.pos):
                         self.selected_tower = None
 
-                    coords = self.tmap.tile_to_screen_coords(tile)
-                    new_tower = self.selected_towertype(coords[0], coords[1])
-                    if self.build_mode and self.tmap.can_build(tile) and self.currency >= new_tower.cost[0]:
+                    if self.build_mode and self.player_act(("build", tile[0], tile[1], self.selected_towertype.__name__)):
                         print("building tower", tile)
                         loop.soundManager.playBuildingSound()
-                        self.tmap.blocking[tile[0]][tile[1]] = new_tower
-                        self.towers.append(new_tower)
-                        self.currency -= new_tower.cost[0]
-                    elif self.build_mode and self.currency <= new_tower.cost[0]:
+                    elif self.build_mode and self.currency <= self.selected_towertype.cost[0]:
                         loop.soundManager.playFailSound()
 
                 # right click to exit build mode
@@ -227,112 +311,99 @@ class Game(Scene):
 
             
             if canbuild:
-                self.screen.blit(self.tmap.selector_open, draw_coords)
-                pygame.draw.circle(self.screen, self.tmap.selector_open.get_at((0,0)), temp.center_pos(self.tmap_offset), temp.max_range, width=1)
+                drawn.append(self.screen.blit(self.tmap.selector_open, draw_coords))
+                drawn.append(pygame.draw.circle(self.screen, self.tmap.selector_open.get_at((0,0)), temp.center_pos(self.tmap_offset), temp.max_range, width=1))
             else:
-                self.screen.blit(self.tmap.selector_closed, draw_coords)
-                pygame.draw.circle(self.screen, self.tmap.selector_closed.get_at((0,0)), temp.center_pos(self.tmap_offset), temp.max_range, width=1)
+                drawn.append(self.screen.blit(self.tmap.selector_closed, draw_coords))
+                drawn.append(pygame.draw.circle(self.screen, self.tmap.selector_closed.get_at((0,0)), temp.center_pos(self.tmap_offset), temp.max_range, width=1))
+
+        profiler.mark("input")
+
+        # the simulation goes in fixed steps so it plays out the same whatever the framerate or speed, see Simulation
+        # fast forward takes more steps a frame rather than longer ones, so fast zombies can't skip past tiles
+        self.step_time += deltatime * self.speed
+        while self.step_time >= FIXED_TIMESTEP:
+            if self.playback_end != None and self.steps >= self.playback_end:
+                break
+            self.step_time -= FIXED_TIMESTEP
+            self.play_step(loop)
+        for play in self.step_sounds:
+            play()
+        self.step_sounds.clear()
 
-        # updating zombies and deleting zombies that reach end
-        to_del = []
         for zombie in self.zombies:
-            zombie.timestep(deltatime)
-            zombie.render(self.screen, self.tmap_offset)
-            if zombie.tile == None:
-                to_del.append(zombie)
-                self.lives -= zombie.lives_impact
-                loop.soundManager.playZombieEndSound()
-        for zombie in to_del:
-            self.zombies.remove(zombie)
-
-        # updating towers
-        for tower in self.towers:
-            tower_pos = tower.center_pos(self.tmap_offset)
-            
-            if not tower.update(deltatime):
-                continue
-
-            in_range = []
-            for z in self.zombies:
-                z_pos = z.center_pos()
-                dist = math.sqrt((z_pos[0] - tower_pos[0]) ** 2 + (z_pos[1] - tower_pos[1]) ** 2)
-                if dist <= tower.max_range:
-                    in_range.append(z)
-
-            if len(in_range) == 0:
-                continue
-
-            # targets zombie closest to end
-            target = min(in_range, key=lambda z: z.dist())
-
-            # adjusted positions are so projectiles can move with offset
-            adjusted_tower_pos = [tower_pos[0] - self.tmap_offset[0], tower_pos[1] - self.tmap_offset[1]]
-            adjusted_target_pos = [target.center_pos()[0] - self.tmap_offset[0], target.center_pos()[1] - self.tmap_offset[1]]
-
-            self.projectiles.append(entity.BulletTrail(adjusted_tower_pos, adjusted_target_pos, tower.bullet_color, tower.bullet_duration))
-            tower.fire(target)
-            target.hit(tower.damage)
-
-            if isinstance(tower, StunTower):
-                target.stun(tower.stun_duration)
-                loop.soundManager.playTaserSound()
-
-            if isinstance(tower, Tower):
-                loop.soundManager.playBulletSound()
-
-            if isinstance(tower, FastTower):
-                loop.soundManager.playBulletSound()
-
-            if isinstance(tower, SniperTower):
-                loop.soundManager.playSniperSound()
-
-            if target.is_dead():
-                loop.soundManager.playZombieDeathSound()
-                self.currency += target.reward
-                self.zombies.remove(target)
+            drawn.append(zombie.render(self.screen, self.tmap_offset))
+        profiler.count("zombie count", len(self.zombies))
+        profiler.count("tower count", len(self.towers))
+        profiler.count("sprite blits", len(self.zombies))
+        profiler.mark("zombie render")
 
         # updating projectiles
         to_del = []
         for p in self.projectiles:
-            p.timestep(deltatime)
-            p.render(self.screen, self.tmap_offset)
+            p.timestep(deltatime * self.speed)
+            drawn.append(p.render(self.screen, self.tmap_offset))
             if p.is_done():
                 to_del.append(p)
         for p in to_del:
             self.projectiles.remove(p)
+            p.release()
+
+        profiler.count("projectile count", len(self.projectiles))
+        profiler.count("sprite blits", len(self.projectiles))
+        drawn.append(self.tower_info_panel.draw_range(self.tmap_offset))
+        profiler.mark("projectiles")
+
+        self.screen.set_clip(None)
+        # the map only changes where something is drawn over it, unless the camera moved
+        drawn = [rect for rect in drawn if rect]
+        if loop.redraw_all or self.tmap_offset != self.drawn_offset or len(drawn) + len(self.drawn_rects) > MAX_DIRTY_RECTS:
+            loop.mark_dirty(GAMESPACE)
+        else:
+            # last frame's too, so what moved away from there gets drawn over
+            for rect in self.drawn_rects + drawn:
+                loop.mark_dirty(rect)
+        self.drawn_rects = drawn
+        self.drawn_offset = list(self.tmap_offset)
 
         # updating ui (buy panel, tower info, lives/currency display, waves display)
         if self.selected_tower != self.tower_info_panel.tower:
             self.tower_info_panel = TowerInfoPanel(self.screen, self.selected_tower, (1030, 70))
-        self.currency = self.tower_info_panel.update(self.currency, loop) # passes back any changes to currency becuase of upgrades
-        self.tower_info_panel.draw(self.tmap_offset)
+        self.tower_info_panel.update(self, loop)
+        loop.mark_dirty(self.tower_info_panel.draw(loop.redraw_all))
         
-        self.waves_display.update(self.waves)
-        self.waves_display.draw()
+        self.waves_display.update(self.waves, self.speed)
         if self.waves_display.next_wave.clicked:
-            self.waves.call_next(self.tmap)
+            self.player_act(("call_next",))
+        if self.waves_display.speed_button.clicked and self.playback == None:
+            self.cycle_speed()
+        loop.mark_dirty(self.waves_display.draw(loop.redraw_all))
 
         self.info_display.update(self.lives, self.currency)
-        self.info_display.draw()
+        loop.mark_dirty(self.info_display.draw(loop.redraw_all))
 
         self.buy_panel.update()
-        self.buy_panel.draw()
         for i, b in enumerate(self.buy_panel.buttons):
             b = b.button
             if self.is_tower_unlocked[i] and b.clicked:
                 self.selected_towertype = self.towertypes[i]
                 self.build_mode = True
                 self.selected_tower = None
-        if self.buy_panel.unlock_advanced_button.clicked and not self.is_tower_unlocked[2] and self.currency >= self.advanced_weapons_cost:
-            self.currency -= self.advanced_weapons_cost
-            self.is_tower_unlocked[2] = True # Sniper
-            self.is_tower_unlocked[3] = True # TASER
+        if self.buy_panel.unlock_advanced_button.clicked and not self.is_tower_unlocked[2]:
+            self.player_act(("unlock",))
+        if self.is_tower_unlocked[2] and not self.buy_panel.unlocked:
             self.buy_panel.unlock_advanced()
+        loop.mark_dirty(self.buy_panel.draw(loop.redraw_all))
+        profiler.mark("ui")
 
         # game end conditions
-        if self.lives < 1 and self.endLoseTime == None:
+        if self.playback_end != None and self.steps >= self.playback_end:
+            self.finish_playback(loop)
+
+        if self.is_lost() and self.endLoseTime == None:
             self.endLoseTime = self.time
             loop.musicManager.fadeout(3000)
+            self.save_replay()
 
         if self.endLoseTime != None and (self.time - self.endLoseTime) >= 3:
             loop.get_scene("endscreen").set_won(False, loop)
@@ -341,9 +412,10 @@ class Game(Scene):
             loop.soundManager.stopSound()
             loop.soundManager.playLevelLoseSound()
 
-        if self.waves.get_finished() and not len(self.zombies) and self.endWinTime == None:
+        if self.is_won() and self.endWinTime == None:
             self.endWinTime = self.time
             loop.musicManager.fadeout(3000)
+            self.save_replay()
         
         if self.endWinTime != None and (self.time - self.endWinTime) >= 3:
             loop.get_scene("endscreen").set_won(True, loop)
@@ -360,10 +432,60 @@ class Game(Scene):
         # pausing
         for event in loop.get_events():
             if event.type == pygame.KEYDOWN and not getattr(event, "used", False) and event.key in [pygame.K_ESCAPE, pygame.K_p]:
+                if self.playback != None: # no level select or progress to go back to
+                    loop.end_game()
                 loop.get_scene("pause").set_return(self)
                 loop.get_scene("pause").ready(self.screen.copy())
                 loop.switch_scene("pause")
                 event.used = True
+        profiler.mark("end")
+
+    # the recording stops where it was saved, which is also where a level that was played to the end ends
+    def finish_playback(self, loop):
+        self.play_actions() # ones after the last step
+        print("replay finished at step", self.steps, Replay.outcome(self))
+        loop.end_game()
+
+
+# what's needed to build a level, the Game itself only gets built once it's played
+class LevelInfo:
+    def __init__(self, screen, image_name, wave_txt_path, starting_lives, starting_currency, description):
+        self.screen = screen
+        self.args = (image_name, wave_txt_path, starting_lives, starting_currency)
+        self.description = description
+        self.game = None
+        self.files = None
+        self.thread = None
+
+    def build(self):
+        game = Game(self.screen, *self.args, files=self.files)
+        game.description = self.description
+        self.game = game
+
+    # only plain file reading happens off the main thread, fonts and surfaces aren't safe to make from two at once
+    def read_files(self):
+        image_name, wave_txt_path = self.args[:2]
+        lines = None if wave_txt_path == None else entity.Waves.read_lines(wave_txt_path)
+        self.files = (mapfile.read(image_name), lines)
+
+    # starts reading the level's files on a background thread, so only the quick part's left by the time it's clicked
+    def prefetch(self):
+        if self.game == None and self.thread == None:
+            self.thread = threading.Thread(target=self.read_files, daemon=True)
+            self.thread.start()
+
+    def get(self):
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.game == None:
+            self.build()
+        return self.game
+
+    # a level that was never built has nothing to reset
+    def reset(self):
+        if self.game:
+            self.game.reset()
 
 
 class LevelSelect(Scene):
@@ -380,17 +502,17 @@ class LevelSelect(Scene):
         self.city_image = load.image("map_enlarged.png").convert()
         self.city_image.set_colorkey((255,255,255))
         
-        self.level1 = Game(screen, "level1", "maps/level1_waves.txt", 25, 500) # rural
-        self.level1.description = "After a long and arduous search, it's clear that you're the only one to even apply for the job of police commissioner here in Riverton. The moment you pick up the uniform from its former occupant, the rural area surrounding you is attacked by zombies!"
+        self.level1 = LevelInfo(screen, "level1", "maps/level1_waves.txt", 25, 500, # rural
+            "After a long and arduous search, it's clear that you're the only one to even apply for the job of police commissioner here in Riverton. The moment you pick up the uniform from its former occupant, the rural area surrounding you is attacked by zombies!")
         
-        self.level2 = Game(screen, "level2", "maps/level2_waves.txt", 25, 600) # suburbs/planned community
-        self.level2.description = "With the help of the PR people (who all somehow managed to survive the first attack), the police department has embarked on an ambitious public campaign to rid the city of zombies within 6 months. The first area on the list on the to-clear list: the suburb on the way into town!"
+        self.level2 = LevelInfo(screen, "level2", "maps/level2_waves.txt", 25, 600, # suburbs/planned community
+            "With the help of the PR people (who all somehow managed to survive the first attack), the police department has embarked on an ambitious public campaign to rid the city of zombies within 6 months. The first area on the list on the to-clear list: the suburb on the way into town!")
         
-        self.level3 = Game(screen, "level3", "maps/level3_waves.txt", 25, 800) # river
-        self.level3.description = "We've received word that a bunch of scientist eggheads are trapped in their lab downtown! They've been studying the virus that causes zombieism; maybe they've discovered something that could help fight off the horde! To get to the lab, we'll first need to clear a path across the bridge."
+        self.level3 = LevelInfo(screen, "level3", "maps/level3_waves.txt", 25, 800, # river
+            "We've received word that a bunch of scientist eggheads are trapped in their lab downtown! They've been studying the virus that causes zombieism; maybe they've discovered something that could help fight off the horde! To get to the lab, we'll first need to clear a path across the bridge.")
 
-        self.level4 = Game(screen, "level4", "maps/level4_waves.txt", 25, 1200) # downtown
-        self.level4.description = "After a heated campaign, we've finally reached the city center, which has become a zombie stronghold since it started as the early epicenter of the virus. It looks to be the most dangerous challenge yet; what a way to get to know a new job! At least the scientists say they're close to a breakthrough."
+        self.level4 = LevelInfo(screen, "level4", "maps/level4_waves.txt", 25, 1200, # downtown
+            "After a heated campaign, we've finally reached the city center, which has become a zombie stronghold since it started as the early epicenter of the virus. It looks to be the most dangerous challenge yet; what a way to get to know a new job! At least the scientists say they're close to a breakthrough.")
 
         self.level1_b = LevelSelectButton(self.screen, self.level1, pygame.Rect(47, 302, 281, 220), "Level 1")
         self.level2_b = LevelSelectButton(self.screen, self.level2, pygame.Rect(353, 121, 318, 219), "Level 2")
@@ -429,7 +551,7 @@ class LevelSelect(Scene):
             b.update(loop)
             if b.unlocked and not b.completed and b.b.clicked:
                 self.most_recent_played = b
-                loop.switch_scene(b.level)
+                loop.switch_scene(b.level.get())
             b.draw()
 
         for event in loop.get_events():
@@ -684,12 +806,26 @@ class Settings(Scene):
 
 
         
-def main():
+def init_display():
     pygame.init()
     screen = pygame.display.set_mode([1280, 720], pygame.SCALED, vsync=True)
     pygame.display.set_caption("The Last Commissioner")
     pygame.display.set_icon(load.image("copicon.png"))
     ready_tiles()
+    return screen
+
+def run(screen, startscene, scenedict):
+    musicManager = MusicManager(startscene.id)
+    loop = Loop(screen, startscene, scenedict, musicManager)
+
+    # populate "need to know" classes with loop reference
+    TextButton.loop = loop
+    TileMap.loop = loop
+    
+    loop.start()
+
+def main():
+    screen = init_display()
 
     menu = MainMenu(screen)
     level_select = LevelSelect(screen)
@@ -702,12 +838,11 @@ def main():
                  "settings": settings, "endscreen": endscreen,
                  "pause": pause, "tutorial": tutorial, "final": final}
     startscene = menu # switch around for debugging, default is "menu"
-    musicManager = MusicManager(startscene.id)
-    loop = Loop(screen, startscene, scenedict, musicManager)
-
-    # populate "need to know" classes with loop reference
-    TextButton.loop = loop
-    TileMap.loop = loop
-    entity.Waves.loop = loop
-    
-    loop.start()
+    run(screen, startscene, scenedict)
+
+# watches a replay in the game, see game/replay.py
+def play_replay(replay, speed=1):
+    screen = init_display()
+    game = Game(screen, *replay.level_args(), seed=replay.seed)
+    game.start_playback(replay, speed)
+    run(screen, game, {})
@@ -1,8 +1,16 @@
 from abc import ABC
+from array import array
+from collections import OrderedDict, deque
+import math
 import random
 random.seed(10)
 
 import pygame
+try:
+    import numpy
+    import pygame.surfarray
+except ImportError: # numpy is optional, without it maps are read a pixel at a time
+    numpy = None
 
 import game.load as load
 import game.utils as utils
@@ -11,8 +19,11 @@ SCALE = 50
 
 # Abstract class fot every thing on the grid
 class Tile(ABC):
+    __slots__ = ("x", "y") # subclasses that don't set their own get a __dict__ as usual, only ones with an object per cell need to
     xdim = 1
     ydim = 1
+    static = True # static tiles get baked into the tilemap's cached chunks
+    flyweight = True # tiles without state of their own, every cell of the class on a map shares one instance
     #passes in x and y pos
     def __init__(self, x, y):
         self.x, self.y = x, y
@@ -26,34 +37,11 @@ class Tile(ABC):
     def link(self, tilemap, x, y):
         pass
 
+# only drawn from the top left cell of each block, which cells those are is kept per layer in TileArray.corners
+# (found for the whole map at once by TileMap.link_multitiles)
 class MultiTile(Tile):
     xdim = 1
     ydim = 1
-    
-    def __init__(self, x, y):
-        super().__init__(x, y)
-        self.corner = False
-    
-    def link(self, tilemap, x, y):
-        distx = 0
-        while type(tilemap[x-distx-1, y]) == type(self):
-            distx += 1
-        
-        disty = 0
-        while type(tilemap[x, y-disty-1]) == type(self):
-            disty += 1
-        
-        
-        if distx%self.xdim == 0 and disty%self.ydim == 0:
-            self.corner = True
-            for ox in range(self.xdim):
-                for oy in range(self.ydim):
-                    if (type(tilemap[self.x+ox, self.y+oy]) != type(self)):
-                        tilemap.map[self.x+ox][self.y+oy] = type(self)(self.x+ox, self.y+oy)
-    
-    def render(self, screen, x, y, offset):
-        if self.corner:
-            super().render(screen, x, y, offset)
 
 class NoTile(Tile):
     image = None
@@ -73,22 +61,61 @@ class Sidewalk(Tile):
 # the images class constant should set a list of all possible connections
 # in the order:   -, '-, ---, -'-, -|-
 class Touching(Tile):
+    __slots__ = ("connections", "rotated_image")
     touchgroup = None
+    flyweight = False
+
+    def __init__(self, x, y):
+        super().__init__(x, y)
+        self.connections = 0
+        self.rotated_image = None # replaces the class image once there's one for the connections
+
+    def render(self, screen, x, y, offset):
+        image = self.image if self.rotated_image == None else self.rotated_image
+        if image != None:
+            screen.blit(image, (x + offset[0], y + offset[1]))
+
     def link(self, tilemap, gx, gy):
-        dirs = []
-        for ox,oy in [(1,0),(0,-1),(-1,0),(0,1)]:
+        self.connect(tilemap, gx, gy, self.find_connections(tilemap, gx, gy))
+
+    # bit n is set if the neighbour that way connects, in the order right, up, left, down
+    def find_connections(self, tilemap, gx, gy):
+        mask = 0
+        for i, (ox,oy) in enumerate([(1,0),(0,-1),(-1,0),(0,1)]):
             tile = tilemap[gx+ox,gy+oy]
             issame = (not self.touchgroup and type(tile) == type(self)) or type(tile) in self.touchgroup
-            dirs.append('1' if issame else '0')
-        
-        for rot in range(4):
-            strdir = ''.join(dirs[rot:]) + ''.join(dirs[:rot])
-            
-            num = int(strdir[::-1], 2)
-            if num in (1,3,5,7,15):
-                img = self.images[(1,3,5,7,15).index(num)]
-                self.image = pygame.transform.rotate(img, 90*rot)
-                return
+            if issame:
+                mask |= 1 << i
+        return mask
+
+    # link with the connections already worked out, like when a whole map's are found at once
+    def connect(self, tilemap, gx, gy, mask):
+        self.connections = mask
+        self.set_image(mask)
+
+    # the rotated images are made once per class and mask, and shared by every tile of every map
+    def set_image(self, mask):
+        rotated = type(self).__dict__.get("rotated")
+        if rotated == None:
+            rotated = type(self).rotated = {}
+        if mask not in rotated:
+            rotated[mask] = None
+            if TOUCHING_SHAPES[mask] != None:
+                shape, rot = TOUCHING_SHAPES[mask]
+                rotated[mask] = pygame.transform.rotate(self.images[shape], 90*rot)
+        self.rotated_image = rotated[mask]
+
+# connection mask -> (index into Touching.images, quarter turns to rotate it), None for ones without an image
+def _touching_shape(mask):
+    dirs = ['1' if mask >> i & 1 else '0' for i in range(4)]
+    for rot in range(4):
+        strdir = ''.join(dirs[rot:]) + ''.join(dirs[:rot])
+        num = int(strdir[::-1], 2)
+        if num in (1,3,5,7,15):
+            return (1,3,5,7,15).index(num), rot
+    return None
+
+TOUCHING_SHAPES = [_touching_shape(mask) for mask in range(16)]
 
 #
 # class Bordered(Tile):
@@ -113,37 +140,90 @@ class Road(Touching):
         load.image("road15.png"),
     ]
     
+    __slots__ = ("next", "path_id")
+
     def __init__(self, x, y):
         super().__init__(x, y)
-        self.next = {}
-    
-    #recursively sets next pointers for roads
-    def setnext(self, newnext, tilemap, endgoal, dist, x, y):
-        self.next[endgoal] = (newnext, dist)
-        End.setnext(self, tilemap, endgoal, dist, x, y)
+        self.next = {} # no paths until it's linked
+
+    # next pointers are read out of the flow fields the ends build on this layer
+    # made once here, zombies look at it every step
+    def connect(self, tilemap, gx, gy, mask):
+        super().connect(tilemap, gx, gy, mask)
+        self.next = RoadNext(tilemap, gx * tilemap.ydim + gy)
 
 class End(Tile):
     image = pygame.Surface((SCALE,SCALE))
     image.fill((0,38,255))
+    flyweight = False
     
     
     # decides path for road tiles
     def link(self, tilemap, gx, gy):
-        self.setnext(tilemap, self, 0, gx, gy)
-    
-    def setnext(self, tilemap, endgoal, dist, gx, gy):
-        for ox,oy in [(-1,0),(0,-1),(1,0),(0,1)]:
-            tile = tilemap[gx+ox,gy+oy]
-            if (type(tile) in (Road, Start) and endgoal not in tile.next):
-                tile.setnext(self, tilemap, endgoal, dist+1, gx+ox, gy+oy)
+        tilemap.fields[self] = FlowField(tilemap, gx, gy)
 
 class Start(Road):
+    __slots__ = ()
     image = pygame.Surface((SCALE, SCALE))
     image.fill((255,0,0))
     touchgroup = []
-    
-    def setnext(self, newnext, tilemap, endgoal, dist, x, y):
-        self.next[endgoal] = (newnext, dist)
+
+# shortest paths from every road tile to one end, found with a breadth first search
+# next and dist hold one entry per cell of the layer (x * ydim + y), -1 where the end can't be reached
+class FlowField:
+    def __init__(self, tilemap, gx, gy):
+        self.next = array('i', [-1]) * (tilemap.xdim * tilemap.ydim)
+        self.dist = array('i', [-1]) * (tilemap.xdim * tilemap.ydim)
+
+        end = gx * tilemap.ydim + gy
+        self.dist[end] = 0
+        queue = deque([(gx, gy)])
+        while queue:
+            x, y = queue.popleft()
+            cell = x * tilemap.ydim + y
+            for ox,oy in [(-1,0),(0,-1),(1,0),(0,1)]:
+                tile = tilemap[x+ox,y+oy]
+                if type(tile) in (Road, Start) and self.dist[cell + ox * tilemap.ydim + oy] == -1:
+                    self.next[cell + ox * tilemap.ydim + oy] = cell
+                    self.dist[cell + ox * tilemap.ydim + oy] = self.dist[cell] + 1
+                    # zombies never walk back out of a start, so paths don't continue through them
+                    if type(tile) != Start:
+                        queue.append((x+ox, y+oy))
+
+    # a field that was worked out before, like one read out of a compiled map (see game/mapfile.py)
+    @classmethod
+    def from_arrays(cls, next, dist):
+        field = cls.__new__(cls)
+        field.next = next
+        field.dist = dist
+        return field
+
+# read only stand in for the old road next dict: next[endgoal] -> (tile, dist)
+class RoadNext:
+    __slots__ = ("tilemap", "cell") # one per road tile, so kept small
+
+    def __init__(self, tilemap, cell):
+        self.tilemap = tilemap
+        self.cell = cell
+
+    def __getitem__(self, endgoal):
+        field = self.tilemap.fields[endgoal]
+        if field.dist[self.cell] == -1:
+            raise KeyError(endgoal)
+        nextcell = field.next[self.cell]
+        return self.tilemap.tile(nextcell), field.dist[self.cell]
+
+    def __contains__(self, endgoal):
+        return endgoal in self.tilemap.fields and self.tilemap.fields[endgoal].dist[self.cell] != -1
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        return [end for end, field in self.tilemap.fields.items() if field.dist[self.cell] != -1]
+
+    def items(self):
+        return [(end, self[end]) for end in self.keys()]
 
 class House(Tile):
     pass
@@ -155,7 +235,7 @@ class BrickHouse(House):
     pass
 
 class BridgeRoad(Road):
-    pass
+    __slots__ = ()
 
 class BridgeGrate(Tile):
     pass
@@ -260,6 +340,8 @@ class GiantApartment(MultiTile):
 
 Road.touchgroup = [Road, Start, End]
 
+TOWER_STATS = ["damage", "max_range", "fire_speed", "stun_duration"] # lists on the tower classes with a value for each level
+
 class Tower(Tile):
     name = "Officer"
     text = "Just a standard cop trying to fend off the zombies"
@@ -268,27 +350,28 @@ class Tower(Tile):
     fire_speed = [1.5, 1.25, 1]  # how many seconds between shots
     bullet_color = (255,255,255)
     bullet_duration = 0.1
+    static = False # turret turns towards its target, so it is drawn every frame
+    flyweight = False
 
     cost = [100, 50, 75] # initial tower cost, then cost of upgrades
 
     base_image = None
     turret_image = None
     turret_image_index = 0
+    info_image_file = "officer_original.png"
+    buy_icon_file = "officer_head.png"
+    locked_icon_file = "locked_head.png"
 
     def __init__(self, x, y):
         super().__init__(x, y)
         self.timer = 0
         self.lvl = 0
-        
-        self.max_level = 99999 # placeholder value
-        # accesses each attribute once to set max level to attribute with least number of upgrades to prevent errors
-        self.damage
-        self.fire_speed
-        self.max_range
+        self.max_level = len(self.stat_table())
+        self.set_stats()
 
-        self.info_image = load.image("officer_original.png")
-        self.buy_icon = load.image("officer_head.png")
-        self.locked_icon = load.image("locked_head.png")
+        self.info_image = load.image(self.info_image_file)
+        self.buy_icon = load.image(self.buy_icon_file)
+        self.locked_icon = load.image(self.locked_icon_file)
 
     def update(self, deltatime):
         self.timer -= deltatime
@@ -310,9 +393,14 @@ class Tower(Tile):
     def center_pos(self, offset):
         return [self.x + offset[0] + SCALE / 2, self.y + offset[1] + SCALE / 2]
 
+    # where it's drawn on screen, a pixel bigger each way for offsets that aren't whole
+    def screen_rect(self, offset):
+        return pygame.Rect(self.x + offset[0] - 1, self.y + offset[1] - 1, SCALE + 2, SCALE + 2)
+
     def upgrade(self):
         if not self.is_max_level():
             self.lvl += 1
+            self.set_stats()
 
     def is_max_level(self):
         return self.lvl >= self.max_level - 1
@@ -321,12 +409,19 @@ class Tower(Tile):
         if not self.is_max_level():
             return self.cost[self.lvl + 1]
 
-    def __getattribute__(self, name):
-        if name in ["damage", "max_range", "fire_speed", "stun_duration"]:
-            self.max_level = min(len(object.__getattribute__(self, name)), self.max_level)
-            return object.__getattribute__(self, name)[self.lvl]
-        else:
-            return object.__getattribute__(self, name)
+    # one {stat: value} per level, made once per tower type from the per level lists on the class
+    # a tower has as many levels as its shortest list
+    @classmethod
+    def stat_table(cls):
+        if "_stat_table" not in cls.__dict__:
+            stats = {stat: getattr(cls, stat) for stat in TOWER_STATS if hasattr(cls, stat)}
+            levels = min(len(values) for values in stats.values())
+            cls._stat_table = [{stat: values[lvl] for stat, values in stats.items()} for lvl in range(levels)]
+        return cls._stat_table
+
+    # copies the current level's stats onto the tower as plain attributes, shadowing the lists on the class
+    def set_stats(self):
+        self.__dict__.update(self.stat_table()[self.lvl])
 
 class FastTower(Tower):
     name = "Hotshot"
@@ -336,11 +431,8 @@ class FastTower(Tower):
     max_range = [110, 120, 130]
     bullet_color = (255, 0, 0)
     cost = [150, 100, 200]
-
-    def __init__(self, x, y):
-        super().__init__(x,y)
-        self.info_image = load.image("redcop.png")
-        self.buy_icon = load.image("redcop_head.png")
+    info_image_file = "redcop.png"
+    buy_icon_file = "redcop_head.png"
 
 class SniperTower(Tower):
     name = "Sniper"
@@ -350,11 +442,8 @@ class SniperTower(Tower):
     max_range = [400, 500]
     bullet_color = (0, 0, 0)
     cost = [200, 150]
-
-    def __init__(self, x, y):
-        super().__init__(x,y)
-        self.info_image = load.image("greycop.png")
-        self.buy_icon = load.image("greycop_head.png")
+    info_image_file = "greycop.png"
+    buy_icon_file = "greycop_head.png"
 
 class StunTower(Tower):
     name = "TASER"
@@ -366,97 +455,155 @@ class StunTower(Tower):
     bullet_color = (0, 0, 255)
     bullet_duration = 0.5
     cost = [125, 100, 150]
+    info_image_file = "bluecop.png"
+    buy_icon_file = "bluecop_head.png"
 
-    def __init__(self, x, y):
-        super().__init__(x,y)
-        self.info_image = load.image("bluecop.png")
-        self.buy_icon = load.image("bluecop_head.png")
-
-def _replace_color(surf, old, new):
+# replacements is a tuple of (old color, new color)
+def _replace_colors(surf, replacements):
     surf = surf.copy()
-    for x in range(surf.get_width()):
-        for y in range(surf.get_height()):
-            if surf.get_at((x,y)) == old:
-                surf.set_at((x,y), new)
+    with pygame.PixelArray(surf) as pixels:
+        for old, new in replacements:
+            pixels.replace(old, new)
     return surf
 
+def _recolored(filepath, replacements):
+    return load.derived(filepath, ("recolor", replacements), lambda surf: _replace_colors(surf, replacements))
+
 def ready_tiles():
-    Grass.image = load.image("grass3.png").convert_alpha()
-    ShortGrass.image = load.image("grass6.png").convert_alpha()
-    Sand.image = load.image("sand.png").convert_alpha()
-    Sidewalk.image = load.image("concrete.png").convert_alpha()
-    Farm.image = load.image("farm.png").convert_alpha()
+    Grass.image = load.image("grass3.png", alpha=True)
+    ShortGrass.image = load.image("grass6.png", alpha=True)
+    Sand.image = load.image("sand.png", alpha=True)
+    Sidewalk.image = load.image("concrete.png", alpha=True)
+    Farm.image = load.image("farm.png", alpha=True)
     
-    ParkingLot.image = load.image("parking.png").convert_alpha()
+    ParkingLot.image = load.image("parking.png", alpha=True)
     
-    SkyScraper.image = load.image("skyscraper.png").convert_alpha()
-    BSkyScraper.image = load.image("brickskyscraper.png").convert_alpha()
-    BSkyScraperT.image = load.image("brickskyscraper-top.png").convert_alpha()
-    BSkyScraperB.image = load.image("brickskyscraper-bottom.png").convert_alpha()
+    SkyScraper.image = load.image("skyscraper.png", alpha=True)
+    BSkyScraper.image = load.image("brickskyscraper.png", alpha=True)
+    BSkyScraperT.image = load.image("brickskyscraper-top.png", alpha=True)
+    BSkyScraperB.image = load.image("brickskyscraper-bottom.png", alpha=True)
     
-    CSkyScraper.image = load.image("concreteskyscraper.png").convert_alpha()
-    CSkyScraperT.image = load.image("concreteskyscraper-top.png").convert_alpha()
-    CSkyScraperB.image = load.image("concreteskyscraper-bottom.png").convert_alpha()
+    CSkyScraper.image = load.image("concreteskyscraper.png", alpha=True)
+    CSkyScraperT.image = load.image("concreteskyscraper-top.png", alpha=True)
+    CSkyScraperB.image = load.image("concreteskyscraper-bottom.png", alpha=True)
     
-    BlueApartment.image = load.image("bigblueapartments.png").convert_alpha()
-    GiantApartment.image = load.image("reallybigapartments.png").convert_alpha()
-    #CSkyScraperB.image = load.image("concreteskyscraper-bottom.png").convert_alpha()
+    BlueApartment.image = load.image("bigblueapartments.png", alpha=True)
+    GiantApartment.image = load.image("reallybigapartments.png", alpha=True)
+    #CSkyScraperB.image = load.image("concreteskyscraper-bottom.png", alpha=True)
     
-    BridgeRoad.image = load.image("bridgeroad.png").convert_alpha()
-    BridgeGrate.image = load.image("bridgegrate.png").convert_alpha()
-    BridgePillars.image = load.image("bridgepillars.png").convert_alpha()
+    BridgeRoad.image = load.image("bridgeroad.png", alpha=True)
+    BridgeGrate.image = load.image("bridgegrate.png", alpha=True)
+    BridgePillars.image = load.image("bridgepillars.png", alpha=True)
     
-    House.image = load.image("smallhouse.png").convert_alpha()
-    HouseVariant1.image = load.image("smallhouse2.png").convert_alpha()
-    BrickHouse.image = load.image("brickhouse.png").convert_alpha()
+    House.image = load.image("smallhouse.png", alpha=True)
+    HouseVariant1.image = load.image("smallhouse2.png", alpha=True)
+    BrickHouse.image = load.image("brickhouse.png", alpha=True)
     
-    BigHouse.image = load.image("garagehouse.png").convert_alpha()
-    BigHouse2.image = load.image("garagehouse2.png").convert_alpha()
-    BigHouse3.image = load.image("garagehouse3.png").convert_alpha()
-    BigHouse4.image = load.image("garagehouse4.png").convert_alpha()
+    BigHouse.image = load.image("garagehouse.png", alpha=True)
+    BigHouse2.image = load.image("garagehouse2.png", alpha=True)
+    BigHouse3.image = load.image("garagehouse3.png", alpha=True)
+    BigHouse4.image = load.image("garagehouse4.png", alpha=True)
     
-    Bush1.image = load.image("bush.png").convert_alpha()
-    Bush2.image = load.image("bush2.png").convert_alpha()
+    Bush1.image = load.image("bush.png", alpha=True)
+    Bush2.image = load.image("bush2.png", alpha=True)
 
-    Tower.base_image = load.image("box.png").convert_alpha()
-    officer = load.image("smofficer.png").convert_alpha()
+    Tower.base_image = load.image("box.png", alpha=True)
+    officer = load.image("smofficer.png", alpha=True)
     Tower.turret_image = [pygame.transform.flip(officer, True, False), officer]
 
-    blue_officer = _replace_color(officer, (239,1,159), (61,61,207))
-    blue_officer = _replace_color(blue_officer, (176,6,145), (19,19,133))
+    blue_officer = _recolored("smofficer.png", (((239,1,159), (61,61,207)), ((176,6,145), (19,19,133)))).convert_alpha()
     StunTower.turret_image = [pygame.transform.flip(blue_officer, True, False), blue_officer]
 
-    red_officer = _replace_color(officer, (239,1,159), (176,16,29))
-    red_officer = _replace_color(red_officer, (176,6,145), (127,9,17))
+    red_officer = _recolored("smofficer.png", (((239,1,159), (176,16,29)), ((176,6,145), (127,9,17)))).convert_alpha()
     FastTower.turret_image = [pygame.transform.flip(red_officer, True, False), red_officer]
 
-    grey_officer = load.image("smofficer_sniper.png")
-    grey_officer = _replace_color(grey_officer, (239,1,159), (105,105,112))
-    grey_officer = _replace_color(grey_officer, (176,6,145), (72,72,75))
+    grey_officer = _recolored("smofficer_sniper.png", (((239,1,159), (105,105,112)), ((176,6,145), (72,72,75))))
     SniperTower.turret_image = [pygame.transform.flip(grey_officer, True, False), grey_officer]
 
-    Water.image = load.image("watertilecenter.png").convert_alpha()
-    WaterLeft.image = load.image("watertileleftedge.png").convert_alpha()
-    WaterRight.image = load.image("watertilerightedge.png").convert_alpha()
+    Water.image = load.image("watertilecenter.png", alpha=True)
+    WaterLeft.image = load.image("watertileleftedge.png", alpha=True)
+    WaterRight.image = load.image("watertilerightedge.png", alpha=True)
     
-    Apartment.image = load.image("apartments.png").convert_alpha()
-    BigApartment.image = load.image("bigapartments.png").convert_alpha()
-
+    Apartment.image = load.image("apartments.png", alpha=True)
+    BigApartment.image = load.image("bigapartments.png", alpha=True)
+
+# every class put on a layer gets an id, layers keep those instead of a tile per cell
+TILE_TYPES = [] # id -> class
+TILE_IDS = {} # class -> id
+SHARED_TILES = [] # id -> the instance every cell of a flyweight class shares, None for the others
+
+def tile_id(tiletype):
+    if tiletype not in TILE_IDS:
+        TILE_IDS[tiletype] = len(TILE_TYPES)
+        TILE_TYPES.append(tiletype)
+        SHARED_TILES.append(tiletype(None, None) if tiletype.flyweight else None)
+    return TILE_IDS[tiletype]
+
+# one layer of a map, a tile class id per cell (x * ydim + y) and objects only for tiles with state of their own
 class TileArray():
-    def __init__(self, tmap):
-        self.map = tmap
-        self.xdim = len(tmap)
-        self.ydim = len(tmap[0])
+    def __init__(self, xdim, ydim, ids=None):
+        self.xdim = xdim
+        self.ydim = ydim
+        self.ids = ids if ids != None else array('B', [tile_id(NoTile)]) * (xdim * ydim)
+        self.corners = bytearray(xdim * ydim) # 1 for the cells multi tiles get drawn from
+        self.objects = {} # cell -> tile, for classes that aren't flyweights
+        self.fields = {} # End -> FlowField
+
     def __getitem__(self, tup):
         x,y = tup
         if x >= 0 and x < self.xdim and y >= 0 and y < self.ydim:
-            return self.map[x][y]
+            return self.tile(x * self.ydim + y)
         else:
             return None
 
+    def __setitem__(self, tup, tile):
+        cell = tup[0] * self.ydim + tup[1]
+        self.ids[cell] = tile_id(type(tile))
+        self.corners[cell] = 0
+        if type(tile).flyweight:
+            self.objects.pop(cell, None)
+        else:
+            self.objects[cell] = tile
+
+    def tile(self, cell):
+        if cell in self.objects:
+            return self.objects[cell]
+        return SHARED_TILES[self.ids[cell]]
+
+    # the class of a tile, without getting the tile
+    def kind(self, x, y):
+        return TILE_TYPES[self.ids[x * self.ydim + y]]
+
+    # makes the objects for cells of classes that aren't flyweights, out of the ids
+    # the cells that need them can be given if they're already known, otherwise all of them get checked
+    def make_objects(self, cells=None):
+        if cells == None:
+            cells = [cell for cell, i in enumerate(self.ids) if SHARED_TILES[i] == None]
+        for cell in cells:
+            self.objects[cell] = TILE_TYPES[self.ids[cell]](cell // self.ydim, cell % self.ydim)
+
+    # tiles with objects of their own, in cell order
+    def unique_tiles(self):
+        return [self.objects[cell] for cell in sorted(self.objects)]
+
+    # every class on the layer
+    def types(self):
+        return {TILE_TYPES[i] for i in set(self.ids)}
+
+    # cells of multi tiles, in cell order
+    def multitile_cells(self):
+        multi = bytes(issubclass(tiletype, MultiTile) for tiletype in TILE_TYPES) + bytes(256 - len(TILE_TYPES))
+        return [cell for cell, is_multi in enumerate(bytes(self.ids).translate(multi)) if is_multi]
+
+    # whether the tile at cell gets drawn there, multi tiles only are at their corners
+    def drawn(self, cell):
+        return self.corners[cell] or not issubclass(TILE_TYPES[self.ids[cell]], MultiTile)
+
 # tilemap
 class TileMap():
     SCALE = SCALE
+    CHUNK = 8 # width and height of a cached render chunk, in tiles
+    MAX_CHUNKS = 48 # baked chunks kept around, least recently drawn ones get thrown away first
     #[BigHouse, BigHouse2, BigHouse3, BigHouse4]
     colormap = {(255,0,0): [Start],
                 (0,38,255): [End],
@@ -500,19 +647,20 @@ class TileMap():
             return random.choice(ret)
         print("WARNING: no tile found for color", color)
         return NoTile
-    
+
+    # builds both layers out of the color of every pixel and links them, game/mapfile.py can do this ahead of time
     def __init__(self, map_surf, blocking_surf):
-        self.map = []
-        self.blocking = []
         self.xdim = map_surf.get_width()
         self.ydim = map_surf.get_height()
-        self.starts = []
 
-        self.build_map(self.map, map_surf)
-        self.build_map(self.blocking, blocking_surf)
-        
-        tmap = TileArray(self.map)
-        tmapblock = TileArray(self.blocking)
+        if numpy != None:
+            ids = [self.classify(map_surf), self.classify(blocking_surf)]
+            self.map, self.blocking = [self.layer_from_ids(layer_ids) for layer_ids in ids]
+        else:
+            self.map = TileArray(self.xdim, self.ydim)
+            self.blocking = TileArray(self.xdim, self.ydim)
+            self.build_map(self.map, map_surf)
+            self.build_map(self.blocking, blocking_surf)
         
         # for x in range(self.xdim):
         #     for y in range(self.ydim):
@@ -520,10 +668,138 @@ class TileMap():
         #             self.map[x][y] = self.blocking[x][y]
         #             self.blocking[x][y] = NoTile(x, y)
         
-        for x in range(self.xdim):
-            for y in range(self.ydim):
-                self.map[x][y].link(tmap, x, y)
-                self.blocking[x][y].link(tmapblock, x, y)
+        if numpy != None:
+            self.link_layer(self.map, ids[0])
+            self.link_layer(self.blocking, ids[1])
+        else:
+            for x in range(self.xdim):
+                for y in range(self.ydim):
+                    self.map[x, y].link(self.map, x, y)
+                    self.blocking[x, y].link(self.blocking, x, y)
+
+        self.problems = self.link_multitiles(self.map) + self.link_multitiles(self.blocking)
+        for problem in self.problems:
+            print("WARNING:", problem)
+
+        self.setup()
+
+    # splits the multi tiles of a layer into blocks of xdim by ydim in one pass, the variants of a color count as the same
+    # a block's top left cell is its corner, and the whole block becomes the corner's variant so it draws as one
+    # returns what's wrong with regions that don't split into whole blocks, those are mistakes in the map
+    def link_multitiles(self, layer):
+        ydim = self.ydim
+        def family(cell):
+            tiletype = TILE_TYPES[layer.ids[cell]]
+            return VARIANT_OF.get(tiletype, tiletype)
+
+        left = {} # cell -> cells of the same kind straight left of it, and up of it
+        up = {}
+        covered = set()
+        problems = []
+        for cell in layer.multitile_cells():
+            tiletype = TILE_TYPES[layer.ids[cell]]
+            x, y = divmod(cell, ydim)
+            kind = family(cell)
+            left[cell] = left[cell - ydim] + 1 if cell - ydim in left and family(cell - ydim) == kind else 0
+            up[cell] = up[cell - 1] + 1 if y > 0 and cell - 1 in up and family(cell - 1) == kind else 0
+
+            if left[cell] % tiletype.xdim == 0 and up[cell] % tiletype.ydim == 0:
+                layer.corners[cell] = 1
+                spills = False
+                for ox in range(tiletype.xdim):
+                    for oy in range(tiletype.ydim):
+                        if x + ox >= self.xdim or y + oy >= self.ydim:
+                            spills = True
+                            continue
+                        other = cell + ox * ydim + oy
+                        # what's next to a block that doesn't fit is left as it is, like roads
+                        if family(other) != kind:
+                            spills = True
+                            continue
+                        if other in covered:
+                            problems.append("%s at %d, %d overlaps another one" % (kind.__name__, x, y))
+                        covered.add(other)
+                        if layer.ids[other] != layer.ids[cell]:
+                            layer.ids[other] = layer.ids[cell]
+                            layer.corners[other] = 0
+                            layer.objects.pop(other, None)
+                if spills:
+                    problems.append("%s at %d, %d is less than a whole %dx%d block, it gets drawn over what's next to it"
+                                    % (kind.__name__, x, y, tiletype.xdim, tiletype.ydim))
+            elif cell not in covered:
+                problems.append("%s at %d, %d isn't part of a whole %dx%d block, so it's never drawn"
+                                % (kind.__name__, x, y, tiletype.xdim, tiletype.ydim))
+        return problems
+
+    # numpy version of build_map, looks up the colors of the whole surface at once
+    # returns an (xdim, ydim) array of tile ids, variants are picked at random like _tile_from_color
+    def classify(self, surf):
+        if not hasattr(TileMap, "color_keys"):
+            colors = sorted(self.colormap)
+            TileMap.color_keys = numpy.array([r << 16 | g << 8 | b for r, g, b in colors])
+            # the variants of a color have ids next to each other
+            TileMap.color_first = numpy.array([TILE_IDS[self.colormap[color][0]] for color in colors])
+            TileMap.color_variants = numpy.array([len(self.colormap[color]) for color in colors])
+
+        pixels = pygame.surfarray.array3d(surf).astype(numpy.int32)
+        colors = pixels[:, :, 0] << 16 | pixels[:, :, 1] << 8 | pixels[:, :, 2]
+        found = numpy.minimum(numpy.searchsorted(self.color_keys, colors), len(self.color_keys) - 1)
+        known = self.color_keys[found] == colors
+        for color in numpy.unique(colors[~known]).tolist():
+            print("WARNING: no tile found for color", (color >> 16, color >> 8 & 255, color & 255))
+
+        variants = numpy.random.default_rng(random.getrandbits(32)).random(colors.shape)
+        ids = self.color_first[found] + (variants * self.color_variants[found]).astype(int)
+        ids[~known] = TILE_IDS[NoTile]
+        return ids
+
+    def layer_from_ids(self, ids):
+        layer = TileArray(self.xdim, self.ydim, array('B', ids.astype(numpy.uint8).tobytes()))
+        needs_object = numpy.array([tile == None for tile in SHARED_TILES])
+        layer.make_objects(numpy.flatnonzero(needs_object[ids]).tolist())
+        return layer
+
+    # links a layer from tiles_from_ids, Touching tiles get their connections from shifted copies of the ids
+    # and tiles that don't do anything when linked are skipped
+    def link_layer(self, layer, ids):
+        masks = numpy.zeros(ids.shape, dtype=numpy.uint8)
+        for i in numpy.unique(ids).tolist():
+            tiletype = TILE_TYPES[i]
+            if issubclass(tiletype, Touching):
+                group = tiletype.touchgroup or [tiletype]
+                touches = numpy.pad(numpy.isin(ids, [TILE_IDS[other] for other in group if other in TILE_IDS]), 1).astype(numpy.uint8)
+                # right, up, left, down like Touching.find_connections
+                mask = touches[2:, 1:-1] | touches[1:-1, :-2] << 1 | touches[:-2, 1:-1] << 2 | touches[1:-1, 2:] << 3
+                masks[ids == i] = mask[ids == i]
+
+        touching = numpy.array([issubclass(tiletype, Touching) for tiletype in TILE_TYPES])
+        linked = numpy.array([tiletype.link is not Tile.link and not issubclass(tiletype, Touching) for tiletype in TILE_TYPES])
+        where = touching[ids]
+        for (x, y), mask in zip(numpy.argwhere(where).tolist(), masks[where].tolist()):
+            layer[x, y].connect(layer, x, y, mask)
+        for x, y in numpy.argwhere(linked[ids]).tolist():
+            layer[x, y].link(layer, x, y)
+
+    # a map out of TileArrays that are already linked
+    @classmethod
+    def from_arrays(cls, tmap, tmapblock):
+        self = cls.__new__(cls)
+        self.map = tmap
+        self.blocking = tmapblock
+        self.xdim = tmap.xdim
+        self.ydim = tmap.ydim
+        self.problems = [] # were found when the layers were linked
+        self.setup()
+        return self
+
+    # everything besides the tiles themselves
+    def setup(self):
+        self.starts = [tile for layer in (self.map, self.blocking) for tile in layer.unique_tiles() if type(tile) == Start]
+
+        # how many tiles a multi tile can draw past its corner, chunks bake the corners that overhang into them
+        self.overhang = max(max(tiletype.xdim, tiletype.ydim) for layer in (self.map, self.blocking) for tiletype in layer.types()) - 1
+        self.chunks = OrderedDict()
+        self.dynamic_tiles = {} # (cx, cy) chunk -> {(x, y): tile}
 
         self.selector_open = pygame.Surface((SCALE,SCALE), pygame.SRCALPHA)
         self.selector_open.fill((0,0,255))
@@ -532,29 +808,86 @@ class TileMap():
         self.selector_closed.fill((255,0,0))
         self.selector_closed.set_alpha(128)
 
-    def build_map(self, map, surf):
+    def build_map(self, layer, surf):
         for x in range(self.xdim):
-            row = []
             for y in range(self.ydim):
                 color = surf.get_at((x,y))[0:3]
-                row.append(self._tile_from_color(color, x, y)(x, y))
-                if (type(row[-1]) == Start):
-                    self.starts.append(row[-1])
-            map.append(row)
+                layer.ids[x * self.ydim + y] = tile_id(self._tile_from_color(color, x, y))
+        layer.make_objects()
    
-    def render(self, screen, offset=[0,0]):
+    # only the chunks overlapping the viewport (a screen rect, whole screen by default) get drawn
+    # returns how many blits it took
+    def render(self, screen, offset=[0,0], viewport=None):
         self.current_offset = offset
-
-        for x in range(self.xdim):
-            for y in range(self.ydim):
-                self.map[x][y].render(screen, x * SCALE, y * SCALE, offset)
-        
-        for x in range(self.xdim):
-            for y in range(self.ydim):
-                self.blocking[x][y].render(screen, x * SCALE, y * SCALE, offset)
+        blits = 0
+        if viewport == None:
+            viewport = screen.get_rect()
+
+        chunk_px = self.CHUNK * SCALE
+        visible = self.visible_chunks(viewport, offset)
+        for cx in visible[0]:
+            for cy in visible[1]:
+                if (cx, cy) in self.chunks:
+                    self.chunks.move_to_end((cx, cy))
+                else:
+                    self.chunks[cx, cy] = self.bake_chunk(cx, cy)
+                    if len(self.chunks) > self.MAX_CHUNKS:
+                        self.chunks.popitem(last=False)
+                screen.blit(self.chunks[cx, cy], (cx * chunk_px + offset[0], cy * chunk_px + offset[1]))
+                blits += 1
+
+        for cx in visible[0]:
+            for cy in visible[1]:
+                for (x, y), tile in self.dynamic_tiles.get((cx, cy), {}).items():
+                    tile.render(screen, x * SCALE, y * SCALE, offset)
+                    blits += 1
 
         pygame.draw.rect(screen, (0,0,0), (offset, (self.xdim * SCALE, self.ydim * SCALE)), width=2)
+        return blits
     
+    # ranges of chunk x and chunk y that overlap the viewport
+    def visible_chunks(self, viewport, offset):
+        chunk_px = self.CHUNK * SCALE
+        x0 = max(int((viewport.left - offset[0]) // chunk_px), 0)
+        x1 = min(int((viewport.right - offset[0]) // chunk_px) + 1, math.ceil(self.xdim / self.CHUNK))
+        y0 = max(int((viewport.top - offset[1]) // chunk_px), 0)
+        y1 = min(int((viewport.bottom - offset[1]) // chunk_px) + 1, math.ceil(self.ydim / self.CHUNK))
+        return range(x0, x1), range(y0, y1)
+
+    # draws every static tile of both layers that shows up in a chunk onto one surface
+    def bake_chunk(self, cx, cy):
+        surf = pygame.Surface((self.CHUNK * SCALE, self.CHUNK * SCALE), pygame.SRCALPHA)
+        # in the display's pixel format blitting it every frame is a plain copy, headless runs have no display to match
+        if pygame.display.get_surface() != None:
+            surf = surf.convert_alpha()
+        x0, y0 = cx * self.CHUNK, cy * self.CHUNK
+        origin = [-x0 * SCALE, -y0 * SCALE]
+
+        xs = range(max(x0 - self.overhang, 0), min(x0 + self.CHUNK, self.xdim))
+        ys = range(max(y0 - self.overhang, 0), min(y0 + self.CHUNK, self.ydim))
+        for layer in (self.map, self.blocking):
+            for x in xs:
+                for y in ys:
+                    tile = layer.tile(x * self.ydim + y)
+                    if tile.static and layer.drawn(x * self.ydim + y):
+                        tile.render(surf, x * SCALE, y * SCALE, origin)
+        return surf
+
+    # throws away the cached chunks a tile could be drawn into, they get rebaked on the next render
+    def invalidate(self, tile):
+        for cx in range(tile[0] // self.CHUNK, (tile[0] + self.overhang) // self.CHUNK + 1):
+            for cy in range(tile[1] // self.CHUNK, (tile[1] + self.overhang) // self.CHUNK + 1):
+                self.chunks.pop((cx, cy), None)
+
+    # puts a new tile (like a tower) onto the blocking layer
+    def set_blocking(self, tile, newtile):
+        self.blocking[tile] = newtile
+        chunk = self.dynamic_tiles.setdefault((tile[0] // self.CHUNK, tile[1] // self.CHUNK), {})
+        chunk.pop(tuple(tile), None)
+        if not newtile.static:
+            chunk[tuple(tile)] = newtile
+        self.invalidate(tile)
+
     # def __getitem__(self, tup):
     #     x,y = tup
     #     if x >= 0 and x < self.xdim and y >= 0 and y < self.ydim:
@@ -576,8 +909,8 @@ class TileMap():
         return [tile[0] * SCALE, tile[1] * SCALE]
 
     def can_build(self, tile):
-        return (isinstance(self.blocking[tile[0]][tile[1]], NoTile)
-        and not type(self.map[tile[0]][tile[1]]) in (Road, Water, WaterRight, WaterLeft))
+        return (issubclass(self.blocking.kind(*tile), NoTile)
+        and not self.map.kind(*tile) in (Road, Water, WaterRight, WaterLeft))
 
     # in tiles
     def get_size(self):
@@ -585,6 +918,10 @@ class TileMap():
 
     def get_px_size(self):
         return self.xdim * SCALE, self.ydim * SCALE
-        
-        
-   
+
+# colormap classes get the first ids, with the variants of each color next to each other
+VARIANT_OF = {} # class -> the first class of its color
+for tiletypes in TileMap.colormap.values():
+    for tiletype in tiletypes:
+        tile_id(tiletype)
+        VARIANT_OF[tiletype] = tiletypes[0]
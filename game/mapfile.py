@@ -0,0 +1,206 @@
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import game.load as load
+from game.map import TileMap, TileArray, Touching, FlowField, TILE_IDS, tile_id
+
+# a compiled map is both layers of a level already linked, so loading one is mapping a file with no pixel decoding,
+# color lookups or path finding. the pngs stay what maps are made in, this is made from them with
+#     python -m game.mapfile [level ...]
+# and is only used while the digest of the pngs it was made from, this file's version and the tile classes still match.
+# the digest only gets worked out when the pngs' sizes or modification times aren't the ones the map was made from
+#
+# everything is little endian, cells go x * ydim + y like the flow fields:
+#     header        magic, version, xdim, ydim, source digest, tiles fingerprint, png sizes, png mtimes in ns,
+#                   number of tile types
+#     tile types    length byte + class name for each, ids index into these
+#     padding       to 4 bytes
+#     per layer     uint8 tile id per cell, uint8 flags per cell, uint32 number of ends,
+#                   then for each end its int32 cell, int32 next per cell and int32 dist per cell
+# the layout only depends on the header and names, so the file is mapped and the flow fields are read straight out of it
+MAGIC = b"TMAP"
+VERSION = 4 # bumped whenever the layout, or how maps get linked, changes
+HEADER = struct.Struct("<4sHHH20s20s2q2qH")
+EXTENSION = ".tmap"
+
+# flags
+CORNER = 0x10 # top left of a multi tile
+CONNECTIONS = 0x0f # Touching.connections
+TO_CORNER = bytes([0, CORNER]) + bytes(254) # TileArray.corners -> flags
+FROM_CORNER = bytes(1 if flags & CORNER else 0 for flags in range(256))
+
+# every class a map can be made of, by name
+TILE_CLASSES = {tiletype.__name__: tiletype for tiletypes in TileMap.colormap.values() for tiletype in tiletypes}
+
+def png_paths(level):
+    return "maps/" + level + "_bg.png", "maps/" + level + "_blocking.png"
+
+def compiled_path(level):
+    return load.handle_path("maps/" + level + EXTENSION)
+
+# the colors, classes and what kind of tile each one is, a compiled map is made with these so it's stale once they change
+def tiles_fingerprint():
+    parts = [str(VERSION)]
+    for color, tiletypes in TileMap.colormap.items():
+        parts.append(repr(color))
+        for tiletype in tiletypes:
+            parts.append(" ".join(base.__name__ for base in tiletype.__mro__) + " " + str(tiletype.flyweight))
+    return hashlib.sha1("\n".join(parts).encode("ascii")).digest()
+
+# what a compiled map has to match to still be up to date
+def source_digest(level):
+    digest = hashlib.sha1(tiles_fingerprint())
+    for filepath in png_paths(level):
+        with open(load.handle_path(filepath), "rb") as file:
+            digest.update(file.read())
+    return digest.digest()
+
+# sizes then mtimes of the pngs, a compiled map with the same ones doesn't need its digest checked
+def source_stats(level):
+    stats = [os.stat(load.handle_path(filepath)) for filepath in png_paths(level)]
+    return [stat.st_size for stat in stats] + [stat.st_mtime_ns for stat in stats]
+
+def _int_bytes(values):
+    values = array('i', values)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+# int32 array out of little endian bytes, a view into them where that can be done without copying
+def _ints(data):
+    if sys.byteorder == "little":
+        return data.cast('i')
+    values = array('i', data)
+    values.byteswap()
+    return values
+
+# the file contents of a linked TileMap
+def compile_tilemap(tmap, digest, stats=(0, 0, 0, 0)):
+    types = sorted({tiletype for layer in (tmap.map, tmap.blocking) for tiletype in layer.types()}, key=lambda tiletype: tiletype.__name__)
+    to_file = bytearray(256) # ids of the running game -> file ids
+    for i, tiletype in enumerate(types):
+        to_file[TILE_IDS[tiletype]] = i
+
+    parts = [HEADER.pack(MAGIC, VERSION, tmap.xdim, tmap.ydim, digest, tiles_fingerprint(), *stats, len(types))]
+    for tiletype in types:
+        parts.append(bytes([len(tiletype.__name__)]) + tiletype.__name__.encode("ascii"))
+    parts.append(bytes(-sum(len(part) for part in parts) % 4))
+
+    cells = tmap.xdim * tmap.ydim
+    for layer in (tmap.map, tmap.blocking):
+        flags = bytearray(bytes(layer.corners).translate(TO_CORNER))
+        for cell, tile in layer.objects.items():
+            if isinstance(tile, Touching):
+                flags[cell] |= getattr(tile, "connections", 0)
+        parts.append(bytes(layer.ids).translate(to_file))
+        parts.append(bytes(flags))
+        parts.append(bytes(-2 * cells % 4))
+
+        parts.append(_int_bytes([len(layer.fields)]))
+        for end, field in layer.fields.items():
+            parts.append(_int_bytes([end.x * tmap.ydim + end.y]))
+            parts.append(_int_bytes(field.next))
+            parts.append(_int_bytes(field.dist))
+    return b"".join(parts)
+
+# a TileMap out of compiled file contents, None if they're from a different version or name a class that's gone
+def read_tilemap(data):
+    data = memoryview(data)
+    magic, version, xdim, ydim, *_, ntypes = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        return None
+
+    pos = HEADER.size
+    types = bytearray(256) # file ids -> ids of the running game
+    for i in range(ntypes):
+        length = data[pos]
+        name = bytes(data[pos + 1:pos + 1 + length]).decode("ascii")
+        if name not in TILE_CLASSES:
+            return None
+        types[i] = tile_id(TILE_CLASSES[name])
+        pos += 1 + length
+    pos += -pos % 4
+
+    cells = xdim * ydim
+    arrays = []
+    for _ in range(2):
+        ids = data[pos:pos + cells]
+        flags = data[pos + cells:pos + 2 * cells]
+        pos += 2 * cells
+        pos += -pos % 4
+
+        layer = TileArray(xdim, ydim, array('B', bytes(ids).translate(types)))
+        layer.corners = bytearray(bytes(flags).translate(FROM_CORNER))
+        layer.make_objects()
+        ends = _ints(data[pos:pos + 4])[0]
+        pos += 4
+        for _ in range(ends):
+            end = _ints(data[pos:pos + 4])[0]
+            pos += 4
+            nexts = _ints(data[pos:pos + 4 * cells])
+            dists = _ints(data[pos + 4 * cells:pos + 8 * cells])
+            pos += 8 * cells
+            layer.fields[layer.tile(end)] = FlowField.from_arrays(nexts, dists)
+
+        for cell, tile in layer.objects.items():
+            if isinstance(tile, Touching):
+                tile.connect(layer, cell // ydim, cell % ydim, flags[cell] & CONNECTIONS)
+        arrays.append(layer)
+    return TileMap.from_arrays(*arrays)
+
+# the level's compiled map mapped read only if it's there and made from the current pngs, otherwise None
+def read(level):
+    try:
+        file = open(compiled_path(level), "rb")
+    except FileNotFoundError:
+        return None
+    with file:
+        if os.fstat(file.fileno()).st_size < HEADER.size:
+            return None
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, xdim, ydim, digest, tiles, *stats, ntypes = HEADER.unpack_from(data)
+    if magic == MAGIC and version == VERSION and tiles == tiles_fingerprint():
+        if stats == source_stats(level) or digest == source_digest(level):
+            return data
+    data.close()
+    return None
+
+# returns where it went, its size and the problems found in the map (TileMap.problems)
+def compile_level(level):
+    tmap = TileMap(*[load.image(filepath) for filepath in png_paths(level)])
+    data = compile_tilemap(tmap, source_digest(level), source_stats(level))
+    # written next to it and swapped in, so a game that has the old one mapped keeps reading that
+    with open(compiled_path(level) + ".tmp", "wb") as file:
+        file.write(data)
+    os.replace(compiled_path(level) + ".tmp", compiled_path(level))
+    return compiled_path(level), len(data), tmap.problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile level pngs into maps that load in one read.")
+    parser.add_argument("levels", nargs="*", help="levels to compile, defaults to every map in data/maps with both pngs")
+    parser.add_argument("--strict", action="store_true", help="exit with 1 if a map has multi tiles that don't split into whole blocks")
+    args = parser.parse_args()
+
+    levels = args.levels
+    if not levels:
+        names = os.listdir(load.handle_path("maps"))
+        levels = sorted(name[:-len("_bg.png")] for name in names
+                        if name.endswith("_bg.png") and name[:-len("_bg.png")] + "_blocking.png" in names)
+    failed = []
+    for level in levels:
+        filepath, size, problems = compile_level(level)
+        print("wrote", filepath, size, "bytes")
+        if problems:
+            failed.append(level)
+    if failed and args.strict:
+        print("problems in", ", ".join(failed))
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
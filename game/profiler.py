@@ -0,0 +1,122 @@
+import csv
+import json
+import time
+from collections import deque
+
+import pygame
+
+from game.utils import GlyphText
+
+OVERLAY_COLOR = (0, 0, 0, 170)
+OVERLAY_TEXTSIZE = 14
+OVERLAY_LINE_HEIGHT = 16
+OVERLAY_COLUMNS = [10, 150, 210, 270] # x of the name and the p50, p95, p99 columns
+OVERLAY_REFRESH = 0.5 # seconds between overlay updates, so the numbers can be read
+
+# times the phases of each frame and counts things in it, keeping the last few hundred frames
+# scenes call mark(phase) as they go, everything since the previous mark is put on that phase
+class Profiler:
+    def __init__(self, history=600):
+        self.frames = deque(maxlen=history) # one dict of phase/counter -> value per frame
+        self.phases = [] # in the order they first showed up, times in ms
+        self.counters = []
+        self.frame = {}
+        self.frame_start = self.last = time.perf_counter()
+
+        self.visible = False
+        self.lines = []
+        self.last_refresh = 0
+        self.background = None
+
+    # finishes the last frame and starts timing a new one
+    def start_frame(self):
+        now = time.perf_counter()
+        if self.frame:
+            self.frame["frame"] = (now - self.frame_start) * 1000
+            self.frames.append(self.frame)
+        self.frame = {}
+        self.frame_start = self.last = now
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        if phase not in self.frame:
+            self.frame[phase] = 0
+            if phase not in self.phases:
+                self.phases.append(phase)
+        self.frame[phase] += (now - self.last) * 1000
+        self.last = now
+
+    def count(self, counter, n=1):
+        if counter not in self.frame:
+            self.frame[counter] = 0
+            if counter not in self.counters:
+                self.counters.append(counter)
+        self.frame[counter] += n
+
+    def columns(self):
+        return ["frame"] + self.phases + self.counters
+
+    # [p50, p95, p99] of a phase or counter over the kept frames
+    def percentiles(self, column, ps=(50, 95, 99)):
+        values = sorted(frame.get(column, 0) for frame in self.frames)
+        if not values:
+            return [0 for p in ps]
+        return [values[min(int(len(values) * p / 100), len(values) - 1)] for p in ps]
+
+    def summary(self):
+        return {column: dict(zip(("p50", "p95", "p99"), self.percentiles(column))) for column in self.columns()}
+
+    def export_csv(self, filepath):
+        columns = self.columns()
+        with open(filepath, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            for frame in self.frames:
+                writer.writerow([round(frame.get(column, 0), 4) for column in columns])
+
+    def export_json(self, filepath):
+        with open(filepath, "w") as file:
+            json.dump({"columns": self.columns(), "summary": self.summary(), "frames": list(self.frames)}, file)
+
+    # writes both, named after the time
+    def export(self):
+        name = time.strftime("profile-%Y%m%d-%H%M%S")
+        self.export_csv(name + ".csv")
+        self.export_json(name + ".json")
+        print("wrote profile to", name + ".csv", "and", name + ".json")
+
+    def update_lines(self):
+        p50 = self.percentiles("frame")[0]
+        rows = [("fps %d" % (1000 / p50 if p50 else 0), "p50", "p95", "p99")]
+        for column in ["frame"] + self.phases:
+            rows.append((column + " ms", *["%.2f" % value for value in self.percentiles(column)]))
+        for column in self.counters:
+            rows.append((column, *["%d" % value for value in self.percentiles(column)]))
+
+        # a GlyphText for every cell, so the columns line up
+        while len(self.lines) < len(rows):
+            y = 10 + len(self.lines) * OVERLAY_LINE_HEIGHT
+            self.lines.append([GlyphText("", [x, y], OVERLAY_TEXTSIZE) for x in OVERLAY_COLUMNS])
+        del self.lines[len(rows):]
+        for i, (line, row) in enumerate(zip(self.lines, rows)):
+            for cell, text in zip(line, row):
+                cell.update_text(text)
+                # lines up the baselines, the rect of text starts at its tallest letter
+                cell.rect.y = 10 + i * OVERLAY_LINE_HEIGHT + OVERLAY_TEXTSIZE - cell.ascent
+
+        size = (OVERLAY_COLUMNS[-1] + 60, len(rows) * OVERLAY_LINE_HEIGHT + 10)
+        if self.background == None or self.background.get_size() != size:
+            self.background = pygame.Surface(size, pygame.SRCALPHA)
+            self.background.fill(OVERLAY_COLOR)
+
+    # returns the rect drawn over
+    def draw(self, screen):
+        if time.perf_counter() - self.last_refresh > OVERLAY_REFRESH or not self.lines:
+            self.last_refresh = time.perf_counter()
+            self.update_lines()
+
+        rect = screen.blit(self.background, (5, 5))
+        for line in self.lines:
+            for cell in line:
+                cell.draw(screen)
+        return rect
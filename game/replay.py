@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import time
+
+from game.simulation import Simulation, FIXED_TIMESTEP
+
+REPLAY_DIR = "replays"
+
+# a recorded session: the level, the seed it was played with and every action with the step it happened at
+# since Simulation only takes randomness from its seed and runs in fixed steps, this is enough to play it out again
+class Replay:
+    def __init__(self, image_name, wave_txt_path, starting_lives, starting_currency, seed, actions, steps, outcome=None, timestep=FIXED_TIMESTEP):
+        self.image_name = image_name
+        self.wave_txt_path = wave_txt_path
+        self.starting_lives = starting_lives
+        self.starting_currency = starting_currency
+        self.seed = seed
+        self.actions = actions # [step, name, args...] like Simulation.actions
+        self.steps = steps # how long the recording goes
+        self.outcome = outcome # Replay.outcome when it was recorded, to check a playback against
+        self.timestep = timestep
+
+    @staticmethod
+    def from_simulation(sim):
+        return Replay(sim.image_name, sim.wave_txt_path, sim.starting_lives, sim.starting_currency,
+                      sim.seed, list(sim.actions), sim.steps, Replay.outcome(sim))
+
+    # what a playback should end up with
+    @staticmethod
+    def outcome(sim):
+        return {"lives": sim.lives, "currency": sim.currency, "waves_cleared": sim.waves_cleared(), "zombies": len(sim.zombies)}
+
+    def level_args(self):
+        return self.image_name, self.wave_txt_path, self.starting_lives, self.starting_currency
+
+    # saves into replays/ named after the level and time if no path is given, returns the path
+    def save(self, filepath=None):
+        if filepath == None:
+            os.makedirs(REPLAY_DIR, exist_ok=True)
+            filepath = os.path.join(REPLAY_DIR, self.image_name + time.strftime("-%Y%m%d-%H%M%S.json"))
+        with open(filepath, "w") as file:
+            json.dump(self.__dict__, file, separators=(",", ":"))
+        return filepath
+
+    @staticmethod
+    def load(filepath):
+        with open(filepath) as file:
+            return Replay(**json.load(file))
+
+# plays a replay as fast as possible without a window, returns the outcome
+def play_headless(replay):
+    sim = Simulation(*replay.level_args(), seed=replay.seed)
+    sim.playback = replay.actions
+    while sim.steps < replay.steps:
+        sim.step(replay.timestep)
+    sim.play_actions() # ones after the last step
+    return Replay.outcome(sim)
+
+def main():
+    parser = argparse.ArgumentParser(description="Play back a recorded game, in the game or headlessly.")
+    parser.add_argument("replay", help="replay file, saved to replays/ when a level ends or with F5")
+    parser.add_argument("--speed", type=float, default=1, help="how many times faster than real time to play it in the game")
+    parser.add_argument("--headless", action="store_true", help="simulate it without a window and check the outcome")
+    args = parser.parse_args()
+
+    replay = Replay.load(args.replay)
+    if args.headless:
+        start = time.perf_counter()
+        outcome = play_headless(replay)
+        print("played", replay.steps, "steps in", round(time.perf_counter() - start, 2), "seconds")
+        print("recorded", replay.outcome)
+        print("replayed", outcome)
+        if outcome != replay.outcome:
+            print("replay did not match the recording")
+            raise SystemExit(1)
+    else:
+        from game.main import play_replay # imports the game, which imports this
+        play_replay(replay, args.speed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import math
+import random
+
+import game.load as load
+import game.entity as entity
+import game.mapfile as mapfile
+from game.map import TileMap, SCALE, Tower, FastTower, SniperTower, StunTower
+
+FIXED_TIMESTEP = 1 / 60
+MAX_MOVE = 0.25 # tiles a zombie can move in one go, any further and it can cut past the tile it's heading to
+TOWER_TYPES = {towertype.__name__: towertype for towertype in (Tower, FastTower, SniperTower, StunTower)}
+
+# the rules of a level without any rendering, input, sound or clock
+# Game plays on top of this, and it can run headless on its own for balance testing
+# wave_txt_path can be None for endless waves, which never finish, so those run until lost (or max_time)
+# everything random that changes how a level plays out comes from self.random, so with the same seed and the
+# same actions at the same steps a level plays out exactly the same (see game/replay.py)
+class Simulation:
+    def __init__(self, image_name, wave_txt_path, starting_lives, starting_currency, seed=None):
+        self.image_name = image_name
+        self.wave_txt_path = wave_txt_path
+        self.starting_lives = starting_lives
+        self.starting_currency = starting_currency
+        self.starting_seed = seed # None for a new one every time the level is loaded
+        self.playback = None # list of recorded actions to play back, see act
+
+        self.load_level()
+
+    # (re)builds the map, waves and everything on it
+    def load_level(self):
+        self.seed = self.starting_seed if self.starting_seed != None else random.getrandbits(32)
+        self.random = random.Random(self.seed)
+        self.steps = 0
+        self.actions = [] # every action as [step, name, args...]
+        self.playback_index = 0
+
+        self.tmap = self.load_tilemap()
+        lines = self.load_wave_lines()
+        if lines == None:
+            self.waves = entity.EndlessWaves(self, self.tmap)
+        else:
+            self.waves = entity.Waves(self, self.wave_txt_path, self.tmap, lines)
+
+        self.zombies = []
+        self.dead_zombies = [] # removed this step, released to the pool at the start of the next one
+        self.zombie_grid = entity.ZombieGrid()
+        self.horde = entity.ZombieHorde(self.tmap) if entity.ZombieHorde.available else None
+
+        self.towers = []
+        self.is_tower_unlocked = [True, True, False, False] # same order as TOWER_TYPES
+        self.advanced_weapons_cost = 400
+
+        self.lives = self.starting_lives
+        self.currency = self.starting_currency
+        self.time = 0
+
+    # the compiled map if there's one made from the current pngs, otherwise the map is built from them
+    def load_tilemap(self):
+        data = self.load_compiled_map()
+        if data != None:
+            tmap = mapfile.read_tilemap(data)
+            if tmap != None:
+                return tmap
+        return TileMap(*self.load_map_images())
+
+    def load_compiled_map(self):
+        return mapfile.read(self.image_name)
+
+    # returns the (background, blocking) surfaces the tilemap is built from
+    def load_map_images(self):
+        bg_image_path = "maps/" + self.image_name + "_bg.png"
+        blocking_image_path = "maps/" + self.image_name + "_blocking.png"
+        return load.image(bg_image_path), load.image(blocking_image_path)
+
+    # no wave file (None) means endless waves
+    def load_wave_lines(self):
+        if self.wave_txt_path == None:
+            return None
+        return entity.Waves.read_lines(self.wave_txt_path)
+
+    # places a tower if the tile is free and it can be afforded, returns whether it was built
+    def build_tower(self, tile, tower):
+        if not self.tmap.can_build(tile) or self.currency < tower.cost[0]:
+            return False
+        self.tmap.set_blocking(tile, tower)
+        self.towers.append(tower)
+        self.currency -= tower.cost[0]
+        return True
+
+    def upgrade_tower(self, tower):
+        if tower.is_max_level() or self.currency < tower.upgrade_cost():
+            return False
+        self.currency -= tower.upgrade_cost()
+        tower.upgrade()
+        return True
+
+    # sniper and taser
+    def unlock_advanced(self):
+        if self.is_tower_unlocked[2] or self.currency < self.advanced_weapons_cost:
+            return False
+        self.currency -= self.advanced_weapons_cost
+        self.is_tower_unlocked[2] = True
+        self.is_tower_unlocked[3] = True
+        return True
+
+    # everything the player does to a level goes through here, so it can be recorded and played back
+    # actions are ("build", x, y, tower type name), ("upgrade", x, y), ("call_next",), ("unlock",) or ("goodwill", amount)
+    # returns whether it worked
+    def act(self, action):
+        self.actions.append([self.steps, *action])
+        name, args = action[0], action[1:]
+        if name == "build":
+            x, y, towertype = args
+            return self.build_tower((x, y), TOWER_TYPES[towertype](x * SCALE, y * SCALE))
+        elif name == "upgrade":
+            tower = self.tmap.blocking[args[0], args[1]]
+            return isinstance(tower, Tower) and self.upgrade_tower(tower)
+        elif name == "call_next":
+            self.waves.call_next(self.tmap)
+            return True
+        elif name == "unlock":
+            return self.unlock_advanced()
+        elif name == "goodwill":
+            self.currency += args[0]
+            return True
+        raise ValueError("unknown action " + str(name))
+
+    # does the actions being played back that happened before this step
+    def play_actions(self):
+        while self.playback_index < len(self.playback) and self.playback[self.playback_index][0] <= self.steps:
+            self.act(self.playback[self.playback_index][1:])
+            self.playback_index += 1
+
+    def remove_zombie(self, zombie):
+        self.zombies.remove(zombie)
+        if zombie.horde:
+            zombie.horde.remove(zombie)
+        self.dead_zombies.append(zombie)
+
+    # removed zombies are still looked at for the rest of the step (like shots at a zombie that died), so they get recycled late
+    def recycle_zombies(self):
+        for zombie in self.dead_zombies:
+            zombie.release()
+        self.dead_zombies.clear()
+
+    # moves every zombie and takes lives for the ones that got through, returns those
+    def move_zombies(self, deltatime):
+        # a long timestep gets split up so even the fastest zombies stay on their path
+        fastest = max(ztype.speed for ztype in entity.Waves.zombiemap.values())
+        substeps = max(1, math.ceil(deltatime * fastest / MAX_MOVE))
+        for _ in range(substeps):
+            if self.horde:
+                self.horde.timestep(self.zombies, deltatime / substeps)
+            else:
+                for zombie in self.zombies:
+                    zombie.timestep(deltatime / substeps)
+
+        reached_end = []
+        for zombie in self.zombies:
+            zombie.update_pos()
+            if zombie.tile == None:
+                reached_end.append(zombie)
+                self.lives -= zombie.lives_impact
+        for zombie in reached_end:
+            self.remove_zombie(zombie)
+
+        self.zombie_grid.rebuild(self.zombies)
+        return reached_end
+
+    # every ready tower shoots the zombie in range closest to the end, returns (tower, target) for each shot
+    def fire_towers(self, deltatime):
+        shots = []
+        for tower in self.towers:
+            if not tower.update(deltatime):
+                continue
+
+            in_range = self.zombie_grid.query(tower.center_pos([0,0]), tower.max_range)
+            if len(in_range) == 0:
+                continue
+
+            # targets zombie closest to end
+            target = min(in_range, key=lambda z: z.dist())
+
+            tower.fire(target)
+            target.hit(tower.damage)
+            if isinstance(tower, StunTower):
+                target.stun(tower.stun_duration)
+
+            if target.is_dead():
+                self.currency += target.reward
+                self.remove_zombie(target)
+
+            shots.append((tower, target))
+        return shots
+
+    # returns the zombies that reached the end and the shots fired, the parts are timed if given a Profiler
+    def step(self, deltatime, profiler=None):
+        if self.playback != None:
+            self.play_actions()
+        self.steps += 1
+        self.time += deltatime
+        self.recycle_zombies()
+        self.waves.update(self.zombies, deltatime)
+        if profiler:
+            profiler.mark("waves")
+        reached_end = self.move_zombies(deltatime)
+        if profiler:
+            profiler.mark("zombie step")
+        shots = self.fire_towers(deltatime)
+        if profiler:
+            profiler.mark("towers")
+        return reached_end, shots
+
+    def is_lost(self):
+        return self.lives < 1
+
+    def is_won(self):
+        return self.waves.get_finished() and not len(self.zombies)
+
+    # waves that are called and completely dealt with
+    def waves_cleared(self):
+        current_wave = self.waves.get_progress()[0]
+        if len(self.zombies) or any(self.waves.zombies_to_spawn):
+            return current_wave - 1
+        return current_wave
+
+    # plays the level as fast as possible with fixed timesteps, calling each wave once the last one is cleared
+    # towers is a list of (tile, tower type) built before the first wave, the ones that can't be built are skipped
+    def run(self, towers=(), deltatime=FIXED_TIMESTEP, max_time=3600):
+        for tile, towertype in towers:
+            self.act(("build", tile[0], tile[1], towertype.__name__))
+
+        wave_times = [] # how long each cleared wave took from being called
+        called_at = self.time
+        while not self.is_won() and not self.is_lost() and self.time < max_time:
+            if not len(self.zombies) and not any(self.waves.zombies_to_spawn):
+                if self.waves.get_progress()[0] > 0:
+                    wave_times.append(self.time - called_at)
+                called_at = self.time
+                self.act(("call_next",))
+            self.step(deltatime)
+        if self.waves_cleared() > len(wave_times):
+            wave_times.append(self.time - called_at)
+
+        return {"won": self.is_won() and not self.is_lost(),
+                "lives": self.lives,
+                "currency": self.currency,
+                "waves_cleared": self.waves_cleared(),
+                "wave_times": wave_times,
+                "time": self.time}
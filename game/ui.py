@@ -1,11 +1,34 @@
 import pygame
 
-from game.utils import Text, TextButton, LinedText, Button
+import game.load as load
+from game.utils import Text, GlyphText, TextButton, LinedText, Button
 
 PANEL_COLOR = (75, 75, 75)
 PANEL_BORDER_COLOR = (0, 0, 0)
 
-class TowerInfoPanel:
+# the screen keeps whatever was painted on a panel between frames, so panels only repaint when what they show changes
+# subclasses give a state() that captures everything they show and paint() everything onto the screen
+class Panel:
+	drawn = None # state() the panel was last painted with
+
+	def state(self):
+		return ()
+
+	def paint(self):
+		self.screen.blit(self.panel, self.pos)
+		pygame.draw.rect(self.screen, PANEL_BORDER_COLOR, (self.pos, self.size), width=4)
+
+	# returns the rect that changed on screen, or None if nothing did
+	def draw(self, redraw_all=True):
+		state = self.state()
+		if state == self.drawn and not redraw_all:
+			return None
+		self.drawn = state
+		self.paint()
+		return self.rect
+
+
+class TowerInfoPanel(Panel):
 	def __init__(self, screen, tower, pos):
 		self.screen = screen
 		self.tower = tower
@@ -21,10 +44,11 @@ class TowerInfoPanel:
 
 		self.title = Text(self.tower.name, [self.pos[0] + self.size[0] / 2, self.pos[1] + 10], 36, centered=True)
 
+		self.shown_lvl = self.tower.lvl
 		self.make_info_text()
 		self.make_upgrade_button()
 
-		self.info_image = pygame.transform.scale(self.tower.info_image, (275,275))
+		self.info_image = load.scaled(self.tower.info_image_file, (275,275))
 		self.flavor_text = LinedText(self.tower.text, (self.pos[0] + 15, self.pos[1] + 330), 30, size=14)
 
 	# updates tower info text, needs to be called when tower is upgraded so info panel is accurate
@@ -45,34 +69,42 @@ class TowerInfoPanel:
 			self.upgrade_button = Text("Max Level", [self.pos[0] + self.size[0] / 2, self.pos[1] + 465], 38, centered=True, color=(255, 204, 0))
 			self.upgrade_cost_text = Text("", self.pos)
 
-	def update(self, currency, loop):
+	# upgrades go through the game, so they get recorded
+	def update(self, game, loop):
 		if self.tower == None:
-			return currency
+			return
 
-		cost = self.tower.upgrade_cost()
-		if not self.tower.is_max_level() and self.upgrade_button.clicked and currency >= cost:
-			self.tower.upgrade()
+		if not self.tower.is_max_level():
+			self.upgrade_button.update()
+
+			if self.upgrade_button.clicked:
+				if game.player_act(("upgrade", self.tower.x // game.tmap.SCALE, self.tower.y // game.tmap.SCALE)):
+					loop.soundManager.playBuildingSound()
+				else:
+					loop.soundManager.playFailSound()
+
+		# also catches upgrades from a replay
+		if self.tower.lvl != self.shown_lvl:
+			self.shown_lvl = self.tower.lvl
 			self.make_info_text()
 			self.make_upgrade_button()
-			loop.soundManager.playBuildingSound()
-			return currency - cost
-		elif not self.tower.is_max_level() and self.upgrade_button.clicked:
-			loop.soundManager.playFailSound()
 
-		return currency
+	# drawn with the map, so it's under the panels, returns where it was drawn
+	def draw_range(self, tmap_offset):
+		if self.tower != None:
+			return pygame.draw.circle(self.screen, (255,255,255), self.tower.center_pos(tmap_offset), self.tower.max_range, width=1)
 
-	def draw(self, tmap_offset):
-		self.screen.blit(self.panel, self.pos)
-		pygame.draw.rect(self.screen, PANEL_BORDER_COLOR, (self.pos, self.size), width=4)
+	def state(self):
+		if self.tower == None:
+			return ()
+		return (self.tower.lvl, self.upgrade_button.rendered)
+
+	def paint(self):
+		super().paint()
 
 		if self.tower == None:
 			return
 
-		# drawing range circle
-		pygame.draw.circle(self.screen, (255,255,255), self.tower.center_pos(tmap_offset), self.tower.max_range, width=1)
-		self.screen.blit(self.panel, self.pos) # has to redraw so panel is on top of range circle
-		pygame.draw.rect(self.screen, PANEL_BORDER_COLOR, (self.pos, self.size), width=4)
-
 		self.title.draw(self.screen)
 		self.lvl_text.draw(self.screen)
 
@@ -83,14 +115,14 @@ class TowerInfoPanel:
 		self.range_text.draw(self.screen)
 		self.speed_text.draw(self.screen)
 
-		self.upgrade_button.draw(self.screen)
+		self.screen.blit(self.upgrade_button.image, self.upgrade_button.rect) # input is handled in update
 		self.upgrade_cost_text.draw(self.screen)
 
 	def get_rect(self):
 		return self.rect
 
 		
-class BuyPanel:
+class BuyPanel(Panel):
 	def __init__(self, screen, pos, towers, is_tower_unlocked, unlock_advanced_icon, unlock_advanced_cost):
 		self.screen = screen
 		self.pos = pos
@@ -99,6 +131,7 @@ class BuyPanel:
 
 		self.size = (1030, 200)
 		self.panel = pygame.Surface(self.size)
+		self.rect = pygame.Rect(self.pos, self.size)
 		self.panel.fill(PANEL_COLOR)
 
 		self.buttons = []
@@ -111,6 +144,7 @@ class BuyPanel:
 		self.unlock_advanced_text2 = Text("Advanced Weapons", [self.pos[0] + 800, self.pos[1] + 135], 24)
 		self.unlock_advanced_cost_text = self.cost_text = Text("Costs " + str(unlock_advanced_cost) + " goodwill", [self.pos[0] + 820, self.pos[1] + 165], 14)
 		self.unlock_advanced_button = Button(pygame.Rect([self.pos[0] + 800, self.pos[1]], [200, 175]))
+		self.unlocked = False
 
 	def update(self):
 		for i,b in enumerate(self.buttons):
@@ -118,9 +152,11 @@ class BuyPanel:
 
 		self.unlock_advanced_button.draw(self.screen)
 
-	def draw(self):
-		self.screen.blit(self.panel, self.pos)
-		pygame.draw.rect(self.screen, PANEL_BORDER_COLOR, (self.pos, self.size), width=4)
+	def state(self):
+		return (tuple(self.is_tower_unlocked), self.unlock_advanced_text2.rendered)
+
+	def paint(self):
+		super().paint()
 
 		for i,b in enumerate(self.buttons):
 			b.draw(self.is_tower_unlocked[i])
@@ -131,6 +167,7 @@ class BuyPanel:
 		self.unlock_advanced_cost_text.draw(self.screen)
 
 	def unlock_advanced(self):
+		self.unlocked = True
 		self.unlock_advanced_text1.update_text("")
 		self.unlock_advanced_text2.update_color((255, 204, 0))
 		self.unlock_advanced_text2.update_text("       Unlocked")
@@ -143,11 +180,11 @@ class BuyButton:
 		self.pos = pos
 		self.tower = tower
 
-		self.icon = pygame.transform.scale(tower.buy_icon, (163,120))
+		self.icon = load.scaled(tower.buy_icon_file, (163,120))
 		self.text = Text("Deploy " + tower.name, [self.pos[0], self.pos[1] + 125], 24)
 		self.cost_text = Text("Costs " + str(tower.cost[0]) + " goodwill", [self.pos[0] + 10, self.pos[1] + 155], 14)
 
-		self.locked_icon = pygame.transform.scale(tower.locked_icon, (163,120))
+		self.locked_icon = load.scaled(tower.locked_icon_file, (163,120))
 		self.locked_text = Text("Deploy " + ("?" * len(tower.name)), [self.pos[0], self.pos[1] + 125], 24)
 		self.locked_cost_text = Text("Costs ??? goodwill", [self.pos[0] + 10, self.pos[1] + 155], 14)
 
@@ -168,55 +205,70 @@ class BuyButton:
 			self.locked_cost_text.draw(self.screen)
 
 
-class InfoDisplay:
+class InfoDisplay(Panel):
 	def __init__(self, screen, pos):
 		self.screen = screen
 		self.pos = pos
 
 		self.size = (250, 70)
 		self.panel = pygame.Surface(self.size)
+		self.rect = pygame.Rect(self.pos, self.size)
 		self.panel.fill(PANEL_COLOR)
 
-		self.lives_text = Text("", [self.pos[0] + 10, self.pos[1] + 5], size=32)
-		self.currency_text = Text("", [self.pos[0] + 10, self.pos[1] + 35], size=32)
+		self.lives_text = GlyphText("", [self.pos[0] + 10, self.pos[1] + 5], size=32)
+		self.currency_text = GlyphText("", [self.pos[0] + 10, self.pos[1] + 35], size=32)
 
 	def update(self, lives, currency):
 		self.lives_text.update_text("Lives: " + str(lives))
 		self.currency_text.update_text("Goodwill: " + str(currency))
 
-	def draw(self):
-		self.screen.blit(self.panel, self.pos)
-		pygame.draw.rect(self.screen, PANEL_BORDER_COLOR, (self.pos, self.size), width=4)
+	def state(self):
+		return (self.lives_text.rendered, self.currency_text.rendered)
+
+	def paint(self):
+		super().paint()
 
 		self.lives_text.draw(self.screen)
 		self.currency_text.draw(self.screen)
 
 
-class WavesDisplay:
+class WavesDisplay(Panel):
 	def __init__(self, screen, pos):
 		self.screen = screen
 		self.pos = pos
 
 		self.size = (250, 120)
 		self.panel = pygame.Surface(self.size)
+		self.rect = pygame.Rect(self.pos, self.size)
 		self.panel.fill(PANEL_COLOR)
 
-		self.waves_text = Text("", [self.pos[0] + 125, self.pos[1] + 20], size=32, centered=True)
+		self.waves_text = GlyphText("", [self.pos[0] + 125, self.pos[1] + 20], size=32, centered=True)
 		self.next_wave = TextButton("[Play]",  [self.pos[0] + 125, self.pos[1] + 70], size=32, centered=True)
+		self.speed_button = TextButton("", [self.pos[0] + 215, self.pos[1] + 8], size=18)
 
-	def update(self, waves):
+	def update(self, waves, speed):
 		wl, wp = waves.get_progress()
-		self.waves_text.update_text(f"Wave {wl}/{wp}")
+		if wp == None: # endless
+			self.waves_text.update_text(f"Wave {wl}")
+		else:
+			self.waves_text.update_text(f"Wave {wl}/{wp}")
 
 		if wl > 0 and self.next_wave.settings[0] == 32:
 			self.next_wave = TextButton("[Call Next]",  [self.pos[0] + 125, self.pos[1] + 70], size=24, centered=True)
+		self.next_wave.update()
 
-	def draw(self):
-		self.screen.blit(self.panel, self.pos)
-		pygame.draw.rect(self.screen, PANEL_BORDER_COLOR, (self.pos, self.size), width=4)
+		self.speed_button.update_text(f"{speed:g}x")
+		self.speed_button.update()
+
+	def state(self):
+		return (self.waves_text.rendered, self.next_wave.rendered, self.speed_button.rendered)
+
+	def paint(self):
+		super().paint()
 
 		self.waves_text.draw(self.screen)
-		self.next_wave.draw(self.screen)
+		self.screen.blit(self.next_wave.image, self.next_wave.rect) # input is handled in update
+		self.screen.blit(self.speed_button.image, self.speed_button.rect)
 
 
 class LevelSelectButton:
@@ -247,6 +299,8 @@ class LevelSelectButton:
 		elif not self.completed:
 			self.current_color = self.unlocked_color
 			self.b.draw(self.screen)
+			if self.b.hovered:
+				self.level.prefetch()
 			if self.b.hovered and self.desc.text.text != "":
 				self.desc.draw(self.completed)
 		else:
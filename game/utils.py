@@ -1,3 +1,4 @@
+from collections import OrderedDict
 import textwrap
 
 import pygame
@@ -12,9 +13,28 @@ font = pygame.freetype.Font(load.handle_path("lora/Lora-Bold.ttf"))
 DEFAULT_HOVERCOLOR = (128,255,0)
 DEFAULT_TEXTSIZE = 16
 DEFAULT_TEXTCOLOR = (255,255,255)
+TEXT_CACHE_SIZE = 512
 
+_text_cache = OrderedDict() # (text, size, color) -> (surface, rect), least recently used get dropped
+_glyphs = {} # (character, size, color) -> (surface, rect, advance)
+
+# rendered surfaces are shared, so don't draw onto them
 def render_text(text, size=DEFAULT_TEXTSIZE, color=DEFAULT_TEXTCOLOR):
-    return font.render(text, size=size, fgcolor=color)
+    key = (text, size, tuple(color))
+    if key in _text_cache:
+        _text_cache.move_to_end(key)
+    else:
+        _text_cache[key] = font.render(text, size=size, fgcolor=color)
+        if len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+    return _text_cache[key]
+
+def render_glyph(char, size=DEFAULT_TEXTSIZE, color=DEFAULT_TEXTCOLOR):
+    key = (char, size, tuple(color))
+    if key not in _glyphs:
+        surf, rect = font.render(char, size=size, fgcolor=color)
+        _glyphs[key] = (surf, rect, font.get_metrics(char, size=size)[0][4])
+    return _glyphs[key]
 
 def draw_text(screen, text, location, size=DEFAULT_TEXTSIZE, color=DEFAULT_TEXTCOLOR, centered=False):
     im, size = render_text(text, size, color)
@@ -27,18 +47,20 @@ class Text:
     def __init__(self, text, location, size=DEFAULT_TEXTSIZE, color=DEFAULT_TEXTCOLOR, centered=False):
         self.text = text
         self.location = location
-        self.image = render_text(text, size, color)[0]
         self.centered = centered
         self.settings = (size, color)
-
-        self.rect = pygame.Rect(self.location[0], self.location[1], self.image.get_width(), self.image.get_height())
-        if self.centered:
-            self.rect.x = self.location[0] - self.image.get_width() / 2
+        self.rendered = None # (text, settings) the image was made with
+        self.update_text(text)
 
     def draw(self, screen):
         screen.blit(self.image, self.rect)
 
+    # does nothing if the text and settings haven't changed since the last render
     def update_text(self, newtext):
+        if (newtext, self.settings) == self.rendered:
+            return
+        self.text = newtext
+        self.rendered = (newtext, self.settings)
         self.image = render_text(newtext, *self.settings)[0]
 
         self.rect = pygame.Rect(self.location[0], self.location[1], self.image.get_width(), self.image.get_height())
@@ -53,6 +75,39 @@ class Text:
         self.location = newloc
         self.rect.topleft = newloc
 
+# Text put together out of cached glyphs, so counters that change all the time never rasterize whole strings
+# there's no kerning, so it can be a pixel or so off from how Text would draw it
+class GlyphText(Text):
+    def update_text(self, newtext):
+        if (newtext, self.settings) == self.rendered:
+            return
+        self.text = newtext
+        self.rendered = (newtext, self.settings)
+
+        glyphs = [render_glyph(char, *self.settings) for char in newtext]
+        ascent = max([rect.y for surf, rect, advance in glyphs], default=0)
+        self.ascent = ascent # baseline, down from the top of the rect
+        left = glyphs[0][1].x if glyphs else 0
+
+        # positions are relative to the top left of the whole string
+        self.glyphs = []
+        pen = 0
+        width = height = 0
+        for surf, rect, advance in glyphs:
+            pos = (int(pen) + rect.x - left, ascent - rect.y)
+            self.glyphs.append((surf, pos))
+            width = max(width, pos[0] + surf.get_width())
+            height = max(height, pos[1] + surf.get_height())
+            pen += advance
+
+        self.rect = pygame.Rect(self.location[0], self.location[1], width, height)
+        if self.centered:
+            self.rect.x = self.location[0] - width / 2
+
+    def draw(self, screen):
+        for surf, pos in self.glyphs:
+            screen.blit(surf, (self.rect.x + pos[0], self.rect.y + pos[1]))
+
 class TextButton(Text):
     def __init__(self, text, location, size=DEFAULT_TEXTSIZE, color=DEFAULT_TEXTCOLOR, centered=False):
         super().__init__(text, location, size, color, centered)
@@ -64,6 +119,10 @@ class TextButton(Text):
 
     def draw(self, screen):
         super().draw(screen)
+        self.update()
+
+    # clicks and hover, split out so buttons on panels that aren't repainted every frame still work
+    def update(self):
         self.clicked = False
         for event in TextButton.loop.get_events():
             if event.type == pygame.MOUSEBUTTONDOWN and not getattr(event, "used", False) and event.button == 1:
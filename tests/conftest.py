@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# headless, has to be set before pygame starts up
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# the game loads everything relative to the repo root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+
+import pygame
+
+pygame.init()
+pygame.display.set_mode([1280, 720])
+
+from game.map import ready_tiles
+
+ready_tiles()
+
+from game import sound
+from game.main import Loop
+from game.utils import TextButton
+
+# a real main loop that doesn't play music or write the settings file, scenes get driven a frame at a time with it
+@pytest.fixture
+def loop(monkeypatch):
+    default = lambda self: {"Volume": {"musicVolume": 0, "soundVolume": 0}}
+    monkeypatch.setattr(sound.MusicManager, "loadVolume", default)
+    monkeypatch.setattr(sound.SoundEffectsManager, "loadVolume", default)
+    loop = Loop(pygame.display.get_surface(), None, {}, sound.MusicManager("test"))
+    monkeypatch.setattr(TextButton, "loop", loop, raising=False)
+    monkeypatch.setattr(loop, "handle_cursor", lambda: None) # the dummy driver has no system cursors
+    return loop
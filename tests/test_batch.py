@@ -0,0 +1,24 @@
+import game.batch as batch
+from game.simulation import Simulation, TOWER_TYPES
+
+def layouts(level):
+    sim = Simulation(level, None, 25, 1000, seed=1)
+    spots = [[x, y] for x in range(sim.tmap.xdim) for y in range(sim.tmap.ydim) if sim.tmap.can_build((x, y))]
+    return [[], [[spots[0], "Tower"]], [[spot, "FastTower"] for spot in spots[::len(spots) // 4][:4]]]
+
+def test_batch_matches_running_one_at_a_time():
+    level_layouts = layouts("level1")
+    results = sorted(batch.evaluate("level1", level_layouts, processes=2), key=lambda result: result["index"])
+    assert [result["towers"] for result in results] == level_layouts
+    for result, towers in zip(results, level_layouts):
+        sim = Simulation("level1", "maps/level1_waves.txt", 25, 1000, seed=10)
+        expected = sim.run([(tuple(tile), TOWER_TYPES[name]) for tile, name in towers])
+        assert {key: result[key] for key in expected} == expected
+
+def test_cached_simulation_loads_files_once(monkeypatch):
+    monkeypatch.setattr(batch, "_assets", {})
+    loads = []
+    monkeypatch.setattr(Simulation, "load_wave_lines", lambda self: loads.append(self.wave_txt_path) or [])
+    for _ in range(3):
+        batch.CachedSimulation("level1", "maps/level1_waves.txt", 25, 1000, seed=1)
+    assert loads == ["maps/level1_waves.txt"]
@@ -0,0 +1,53 @@
+import copy
+import json
+
+import pygame
+
+import game.benchmark as benchmark
+from game.map import Road
+from game.simulation import Simulation
+
+def test_levels_in_number_order():
+    assert benchmark.find_levels() == ["level1", "level2", "level3", "level4"]
+
+def test_tower_spots_next_to_roads():
+    tmap = Simulation("level2", "maps/level2_waves.txt", 25, 600, seed=0).tmap
+    spots = benchmark.tower_spots(tmap)
+    assert spots
+    for x, y in spots:
+        assert tmap.can_build((x, y))
+        assert any(isinstance(tmap.blocking[pos], Road) for pos in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)))
+
+def test_bench_level():
+    result = benchmark.bench_level(pygame.display.get_surface(), "level1", 2, 1, 5, 1)
+    assert result["towers"] == 4
+    assert result["zombies"] > 0
+    assert list(result["phases"]) == ["frame", "zombie step", "tower targeting", "render", "ui"]
+    assert result["tilemap_build_ms"] > 0
+
+def results(ms):
+    return {"levels": {"level1": {"tilemap_build_ms": ms, "compiled_load_ms": None,
+                                  "phases": {"frame": {"p50": ms}, "ui": {"p50": 0.01}}}}}
+
+def test_compare_flags_regressions():
+    assert dict(benchmark.metrics(results(10))) == {"level1 tilemap build": 10, "level1 frame": 10, "level1 ui": 0.01}
+    assert benchmark.compare(results(12), results(10), 0.25) == []
+    assert benchmark.compare(results(13), results(10), 0.25) == ["level1 tilemap build", "level1 frame"]
+    # too small to tell from noise
+    slower_ui = results(10)
+    slower_ui["levels"]["level1"]["phases"]["ui"]["p50"] = 0.05
+    assert benchmark.compare(slower_ui, results(10), 0.25) == []
+
+def test_compare_skips_what_baseline_lacks():
+    new = results(10)
+    new["levels"]["level2"] = copy.deepcopy(new["levels"]["level1"])
+    assert benchmark.compare(new, results(1000), 0.25) == []
+
+def test_committed_baseline_covers_every_level():
+    with open("benchmark_baseline.json") as file:
+        baseline = json.load(file)
+    assert baseline["meta"]["frames"] == 300
+    names = dict(benchmark.metrics(baseline))
+    for level in benchmark.find_levels():
+        for phase in ["tilemap build", "compiled load", "frame", "zombie step", "tower targeting", "render", "ui"]:
+            assert level + " " + phase in names
@@ -0,0 +1,49 @@
+import pygame
+import pytest
+
+import game.load as load
+import game.mapfile as mapfile
+from game.map import TileMap, Tower, SCALE
+
+def build(level):
+    return TileMap(*[load.image(filepath) for filepath in mapfile.png_paths(level)])
+
+# every tile drawn straight onto the screen, the way the map was drawn before it had chunks
+def draw_tiles(tmap, screen, offset):
+    for layer in (tmap.map, tmap.blocking):
+        for x in range(tmap.xdim):
+            for y in range(tmap.ydim):
+                cell = x * tmap.ydim + y
+                if layer.drawn(cell):
+                    layer.tile(cell).render(screen, x * SCALE, y * SCALE, offset)
+    pygame.draw.rect(screen, (0,0,0), (offset, (tmap.xdim * SCALE, tmap.ydim * SCALE)), width=2)
+
+def same_picture(tmap, offset):
+    screen = pygame.display.get_surface()
+    expected = pygame.Surface(screen.get_size())
+    expected.fill((0,128,0))
+    draw_tiles(tmap, expected, offset)
+    screen.fill((0,128,0))
+    tmap.render(screen, offset)
+    return pygame.image.tostring(screen, "RGB") == pygame.image.tostring(expected, "RGB")
+
+@pytest.mark.parametrize("level", ["level1", "level2", "level3", "level4"])
+def test_chunks_draw_the_same_as_tiles(level):
+    tmap = build(level)
+    for offset in ([0, 0], [-137, -263], [90, 40]):
+        assert same_picture(tmap, offset)
+
+def test_chunks_rebaked_after_building():
+    tmap = build("level1")
+    assert same_picture(tmap, [0, 0])
+    tile = next((x, y) for x in range(tmap.xdim) for y in range(tmap.ydim) if tmap.can_build((x, y)))
+    tmap.set_blocking(tile, Tower(tile[0] * SCALE, tile[1] * SCALE))
+    assert same_picture(tmap, [0, 0])
+
+def test_chunks_kept_at_most_max():
+    tmap = build("level4")
+    screen = pygame.display.get_surface()
+    for x in range(0, tmap.xdim * SCALE, 400):
+        for y in range(0, tmap.ydim * SCALE, 400):
+            tmap.render(screen, [-x, -y])
+            assert len(tmap.chunks) <= tmap.MAX_CHUNKS
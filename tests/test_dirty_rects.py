@@ -0,0 +1,56 @@
+import pygame
+
+from game.main import Game, GAMESPACE, BACKGROUND_COLOR
+
+def game_with_towers(loop, level):
+    game = Game(loop.screen, level, "maps/" + level + "_waves.txt", 25, 99999, seed=2)
+    spots = [(x, y) for x in range(game.tmap.xdim) for y in range(game.tmap.ydim) if game.tmap.can_build((x, y))]
+    for x, y in spots[::len(spots) // 20][:20]:
+        game.act(("build", x, y, "Tower"))
+    loop.scene = game
+    loop.ticktime = 1 / 60
+    return game
+
+# runs frames like Loop.start, yields the screen and what the display would show going by the dirty rects
+def frames(loop, count):
+    shown = None
+    for i in range(count):
+        loop.redraw_all = i == 0
+        loop.dirty_rects.clear()
+        if loop.redraw_all:
+            loop.screen.fill(BACKGROUND_COLOR)
+        loop.scene.update(loop)
+        if loop.redraw_all:
+            shown = loop.screen.copy()
+        else:
+            for rect in loop.dirty_rects:
+                shown.blit(loop.screen, rect, rect)
+        yield i, shown
+
+def same(a, b):
+    return pygame.image.tostring(a, "RGB") == pygame.image.tostring(b, "RGB")
+
+def test_dirty_rects_cover_every_change(loop):
+    game = game_with_towers(loop, "level2")
+    game.waves.call_next(game.tmap)
+    for i, shown in frames(loop, 400):
+        if i == 100:
+            game.selected_tower = game.towers[3]
+        if i == 250:
+            game.selected_tower = None
+        assert same(shown, loop.screen), "frame %d" % i
+    assert game.zombies
+
+def test_still_map_not_updated(loop):
+    game_with_towers(loop, "level1")
+    for i, shown in frames(loop, 3):
+        pass
+    assert GAMESPACE not in loop.dirty_rects
+    assert sum(rect.width * rect.height for rect in loop.dirty_rects) < GAMESPACE.width * GAMESPACE.height // 4
+
+def test_whole_map_updated_when_camera_moves(loop):
+    game = game_with_towers(loop, "level1")
+    for i, shown in frames(loop, 3):
+        if i == 2:
+            assert GAMESPACE in loop.dirty_rects
+        game.tmap_offset[0] += 10
@@ -0,0 +1,35 @@
+import pytest
+
+from game.simulation import Simulation
+
+def endless(level, seed=1):
+    return Simulation(level, None, 25, 600, seed=seed).waves
+
+def cost(runs, threats):
+    return sum(threats[ztype] * count for ztype, count in runs)
+
+@pytest.mark.parametrize("level", ["level1", "level4"])
+def test_endless_waves_fit_budget(level):
+    waves = endless(level)
+    cheapest = min(waves.threats.values())
+    for n in range(1, 16):
+        budget = waves.base_budget * waves.growth ** (n - 1)
+        wave = waves.generate(n)
+        assert len(wave) == len(waves.tmap.starts)
+        for runs in wave:
+            # every spawnpoint gets something, and only goes over its share to do that
+            assert runs
+            assert cost(runs, waves.threats) <= budget / len(wave) + cheapest
+            for ztype, count in runs:
+                assert count > 0
+                assert waves.threats[ztype] * 4 <= budget
+            # runs of the same type are merged
+            assert all(a[0] != b[0] for a, b in zip(runs, runs[1:]))
+
+def test_endless_waves_grow():
+    waves = endless("level2")
+    costs = [sum(cost(runs, waves.threats) for runs in waves.generate(n)) for n in (1, 10, 20)]
+    assert costs[0] < costs[1] < costs[2]
+
+def test_endless_waves_seeded():
+    assert endless("level2", 5).generate(8) == endless("level2", 5).generate(8)
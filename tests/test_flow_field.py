@@ -0,0 +1,76 @@
+from collections import deque
+
+import pygame
+import pytest
+
+import game.load as load
+import game.mapfile as mapfile
+from game.map import TileMap, Road, Start
+
+COLORS = {".": (255,255,255), "#": (64,64,64), "S": (255,0,0), "E": (0,38,255)}
+
+def build(level):
+    return TileMap(*[load.image(filepath) for filepath in mapfile.png_paths(level)])
+
+# a map out of rows of characters on the blocking layer, see COLORS
+def build_rows(rows):
+    bg = pygame.Surface((len(rows[0]), len(rows)))
+    bg.fill(COLORS["."])
+    blocking = bg.copy()
+    for y, row in enumerate(rows):
+        for x, char in enumerate(row):
+            blocking.set_at((x, y), COLORS[char])
+    return TileMap(bg, blocking)
+
+# the search End.link used to do before flow fields, kept as plain dicts: road tile -> steps to the end
+def reference_dists(layer, gx, gy):
+    dists = {(gx, gy): 0}
+    queue = deque([(gx, gy)])
+    while queue:
+        x, y = queue.popleft()
+        for ox, oy in [(-1,0),(0,-1),(1,0),(0,1)]:
+            pos = (x+ox, y+oy)
+            if type(layer[pos]) in (Road, Start) and pos not in dists:
+                dists[pos] = dists[x, y] + 1
+                if type(layer[pos]) != Start:
+                    queue.append(pos)
+    return dists
+
+def check_fields(tmap):
+    for layer in (tmap.map, tmap.blocking):
+        for end in layer.fields:
+            dists = reference_dists(layer, end.x, end.y)
+            for tile in layer.unique_tiles():
+                if not isinstance(tile, Road):
+                    continue
+                if (tile.x, tile.y) not in dists:
+                    assert end not in tile.next
+                    continue
+                nexttile, dist = tile.next[end]
+                assert dist == dists[tile.x, tile.y]
+                # one step closer every hop
+                assert abs(nexttile.x - tile.x) + abs(nexttile.y - tile.y) == 1
+                assert dists[nexttile.x, nexttile.y] == dist - 1
+
+@pytest.mark.parametrize("level", ["level1", "level2", "level3", "level4"])
+def test_flow_fields_match_search(level):
+    check_fields(build(level))
+
+def test_flow_field_takes_shortest_way_round_loop():
+    tmap = build_rows(["S#####",
+                       "#....#",
+                       "###E##"])
+    check_fields(tmap)
+    start = tmap.starts[0]
+    end = next(iter(tmap.blocking.fields))
+    assert start.next[end][1] == 5
+    assert (start.next[end][0].x, start.next[end][0].y) == (0, 1)
+
+def test_unreachable_road_has_no_path():
+    tmap = build_rows(["S#E..",
+                       ".....",
+                       "..##."])
+    end = next(iter(tmap.blocking.fields))
+    assert end in tmap.starts[0].next
+    assert end not in tmap.blocking[2, 2].next
+    assert tmap.blocking[2, 2].next.keys() == []
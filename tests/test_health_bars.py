@@ -0,0 +1,29 @@
+from game.entity import ZombieBase, Zombie, GiantZombie
+from game.simulation import Simulation
+
+def zombies(ztype, n):
+    sim = Simulation("level1", "maps/level1_waves.txt", 25, 600, seed=2)
+    return [ztype.create(sim, sim.tmap.starts[0]) for _ in range(n)]
+
+def test_bars_shared_by_width():
+    a, b = zombies(Zombie, 2)
+    assert a.health_bar is b.health_bar
+    a.hit(50)
+    b.hit(50)
+    assert a.health_bar is b.health_bar
+    assert a.health_bar.get_width() == ZombieBase.max_health_bar_width * 3 // 4
+
+def test_bar_follows_health():
+    giant, = zombies(GiantZombie, 1)
+    assert giant.health_bar.get_width() == giant.max_health_bar_width
+    giant.hit(giant.max_health // 2)
+    assert giant.health_bar.get_width() == giant.max_health_bar_width // 2
+    giant.hit(giant.max_health)
+    assert giant.health_bar.get_width() == 0
+
+def test_one_bar_per_width():
+    for zombie in zombies(GiantZombie, 20):
+        for _ in range(30):
+            zombie.hit(37)
+    assert set(ZombieBase.health_bars) <= set(range(ZombieBase.max_health_bar_width + 1))
+    assert all(bar.get_width() == width for width, bar in ZombieBase.health_bars.items())
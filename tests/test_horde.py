@@ -0,0 +1,18 @@
+import pytest
+
+import game.entity as entity
+from game.simulation import Simulation
+
+@pytest.mark.skipif(entity.numpy == None, reason="needs numpy")
+def test_horde_drops_removed_hooks_in_order():
+    sim = Simulation("level1", "maps/level1_waves.txt", 25, 600, seed=2)
+    start = sim.tmap.starts[0]
+    horde = sim.horde
+    zombies = [entity.SummonerZombie.create(sim, start) for _ in range(4)] + [entity.Zombie.create(sim, start)]
+    for zombie in zombies:
+        horde.add(zombie)
+    horde.remove(zombies[1])
+    horde.timestep([z for z in zombies if z is not zombies[1]], 0)
+    assert horde.hooked == [zombies[0], zombies[2], zombies[3]]
+    assert [zombie.hook_slot for zombie in horde.hooked] == [0, 1, 2]
+    assert zombies[1].hook_slot == None
@@ -0,0 +1,39 @@
+import pygame
+
+import game.entity as entity
+import game.mapfile as mapfile
+from game.main import LevelInfo
+
+def level_info():
+    return LevelInfo(pygame.display.get_surface(), "level1", "maps/level1_waves.txt", 25, 500, "rural")
+
+# what gets read from disk, in order
+def counting_reads(monkeypatch):
+    reads = []
+    read, read_lines = mapfile.read, entity.Waves.read_lines
+    monkeypatch.setattr(mapfile, "read", lambda level: reads.append(level) or read(level))
+    monkeypatch.setattr(entity.Waves, "read_lines", staticmethod(lambda filepath: reads.append(filepath) or read_lines(filepath)))
+    return reads
+
+def test_level_built_when_first_got(monkeypatch):
+    reads = counting_reads(monkeypatch)
+    info = level_info()
+    info.reset()
+    assert info.game == None and reads == []
+    game = info.get()
+    assert game.description == "rural"
+    assert info.get() is game
+    assert reads == ["level1", "maps/level1_waves.txt"]
+
+def test_prefetched_files_used(monkeypatch):
+    reads = counting_reads(monkeypatch)
+    info = level_info()
+    info.prefetch()
+    info.prefetch()
+    game = info.get()
+    # read once on the thread, the game doesn't read them again
+    assert reads == ["maps/level1_waves.txt", "level1"]
+    assert game.files is info.files
+    assert game.waves.total_waves == len(info.files[1])
+    info.prefetch()
+    assert info.thread == None
@@ -0,0 +1,51 @@
+import os
+
+import pygame
+import pytest
+
+import game.load as load
+
+def test_image_loaded_once():
+    assert load.image("cart.png") is load.image("cart.png")
+    assert load.image("cart.png", True) is not load.image("cart.png")
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(load, "CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(load, "_derived", {})
+    return tmp_path
+
+def flipped(calls):
+    def make(surf):
+        calls.append(surf)
+        return pygame.transform.flip(surf, True, False)
+    return make
+
+def test_derived_made_once_and_saved(cache):
+    calls = []
+    first = load.derived("cart.png", ("flip", True), flipped(calls))
+    assert load.derived("cart.png", ("flip", True), flipped(calls)) is first
+    assert len(calls) == 1
+    assert len(os.listdir(cache)) == 1
+
+def test_derived_read_back_on_warm_start(cache, monkeypatch):
+    calls = []
+    first = load.derived("cart.png", ("flip", True), flipped(calls))
+    monkeypatch.setattr(load, "_derived", {})
+    again = load.derived("cart.png", ("flip", True), flipped(calls))
+    assert len(calls) == 1
+    assert pygame.image.tostring(again, "RGBA") == pygame.image.tostring(first, "RGBA")
+
+def test_other_recipe_other_file(cache):
+    load.derived("cart.png", ("flip", True), flipped([]))
+    load.scaled("cart.png", (10, 10))
+    assert len(os.listdir(cache)) == 2
+    assert load.scaled("cart.png", (10, 10)).get_size() == (10, 10)
+
+def test_derived_without_cache_folder(tmp_path, monkeypatch):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    # a file where the folder should be, so it can't be made
+    monkeypatch.setattr(load, "CACHE_PATH", str(blocker / "cache"))
+    monkeypatch.setattr(load, "_derived", {})
+    assert load.scaled("cart.png", (10, 10)).get_size() == (10, 10)
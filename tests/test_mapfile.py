@@ -0,0 +1,62 @@
+import pytest
+
+import game.load as load
+import game.mapfile as mapfile
+from game.map import TileMap, Touching, VARIANT_OF
+
+def build(level):
+    return TileMap(*[load.image(filepath) for filepath in mapfile.png_paths(level)])
+
+# everything about a map that a compiled one has to keep, variants are random so different builds only match by color
+def contents(tmap, variants=True):
+    layers = []
+    for layer in (tmap.map, tmap.blocking):
+        kinds = [layer.kind(x, y) for x in range(tmap.xdim) for y in range(tmap.ydim)]
+        if not variants:
+            kinds = [VARIANT_OF.get(kind, kind) for kind in kinds]
+        connections = {cell: tile.connections for cell, tile in layer.objects.items() if isinstance(tile, Touching)}
+        fields = {(end.x, end.y): (list(field.next), list(field.dist)) for end, field in layer.fields.items()}
+        layers.append((kinds, bytes(layer.corners), connections, fields))
+    return tmap.xdim, tmap.ydim, layers, [(start.x, start.y) for start in tmap.starts]
+
+@pytest.mark.parametrize("level", ["level1", "level2", "level3", "level4"])
+def test_round_trip(level):
+    tmap = build(level)
+    data = mapfile.compile_tilemap(tmap, bytes(20))
+    assert contents(mapfile.read_tilemap(data)) == contents(tmap)
+
+def test_other_version_not_read():
+    data = bytearray(mapfile.compile_tilemap(build("level1"), bytes(20)))
+    data[4] += 1
+    assert mapfile.read_tilemap(bytes(data)) == None
+
+def test_unknown_class_not_read():
+    data = mapfile.compile_tilemap(build("level1"), bytes(20))
+    assert mapfile.read_tilemap(data.replace(b"Road", b"Raod", 1)) == None
+
+@pytest.fixture
+def compiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(mapfile, "compiled_path", lambda level: str(tmp_path / (level + mapfile.EXTENSION)))
+    mapfile.compile_level("level1")
+
+def test_read_compiled(compiled):
+    data = mapfile.read("level1")
+    assert contents(mapfile.read_tilemap(data), False) == contents(build("level1"), False)
+
+# touched pngs with the same contents only cost a hash
+def test_read_with_changed_stats(compiled, monkeypatch):
+    monkeypatch.setattr(mapfile, "source_stats", lambda level: [0, 0, 0, 0])
+    assert mapfile.read("level1") != None
+
+def test_stale_not_read(compiled, monkeypatch):
+    monkeypatch.setattr(mapfile, "source_stats", lambda level: [0, 0, 0, 0])
+    monkeypatch.setattr(mapfile, "source_digest", lambda level: bytes(20))
+    assert mapfile.read("level1") == None
+
+def test_changed_tiles_not_read(compiled, monkeypatch):
+    monkeypatch.setattr(mapfile, "tiles_fingerprint", lambda: bytes(20))
+    assert mapfile.read("level1") == None
+
+def test_missing_not_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(mapfile, "compiled_path", lambda level: str(tmp_path / "missing.tmap"))
+    assert mapfile.read("level1") == None
@@ -0,0 +1,49 @@
+import pygame
+
+import game.load as load
+import game.mapfile as mapfile
+from game.map import TileMap, Road, NoTile, BigHouse, VARIANT_OF
+
+COLORS = {".": (255,255,255), "#": (64,64,64), "B": (0,127,127)}
+
+# a map out of rows of characters on the blocking layer, see COLORS
+def build_rows(rows):
+    bg = pygame.Surface((len(rows[0]), len(rows)))
+    bg.fill(COLORS["."])
+    blocking = bg.copy()
+    for y, row in enumerate(rows):
+        for x, char in enumerate(row):
+            blocking.set_at((x, y), COLORS[char])
+    return TileMap(bg, blocking)
+
+def family(layer, x, y):
+    return VARIANT_OF.get(layer.kind(x, y), layer.kind(x, y))
+
+def test_whole_block_drawn_as_one():
+    tmap = build_rows(["BB.",
+                       "BB."])
+    kinds = {tmap.blocking.kind(x, y) for x in range(2) for y in range(2)}
+    assert len(kinds) == 1 and VARIANT_OF[kinds.pop()] == BigHouse
+    assert [cell for cell, corner in enumerate(tmap.blocking.corners) if corner] == [0]
+    assert tmap.problems == []
+
+def test_block_that_spills_leaves_roads():
+    tmap = build_rows(["B#.",
+                       "##."])
+    assert family(tmap.blocking, 0, 0) == BigHouse
+    for x, y in [(1, 0), (0, 1), (1, 1)]:
+        assert tmap.blocking.kind(x, y) == Road
+        assert isinstance(tmap.blocking.objects[x * tmap.ydim + y], Road)
+    assert tmap.blocking.corners[0] == 1
+    assert tmap.problems == ["BigHouse at 0, 0 is less than a whole 2x2 block, it gets drawn over what's next to it"]
+
+def test_level2_keeps_its_colors():
+    surfs = [load.image(filepath) for filepath in mapfile.png_paths("level2")]
+    tmap = TileMap(*surfs)
+    assert tmap.problems == ["BigHouse at 21, 1 is less than a whole 2x2 block, it gets drawn over what's next to it",
+                             "BigHouse at 21, 8 is less than a whole 2x2 block, it gets drawn over what's next to it"]
+    for layer, surf in zip((tmap.map, tmap.blocking), surfs):
+        for x in range(tmap.xdim):
+            for y in range(tmap.ydim):
+                expected = TileMap.colormap.get(tuple(surf.get_at((x, y)))[:3], [NoTile])[0]
+                assert family(layer, x, y) == expected
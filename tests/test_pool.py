@@ -0,0 +1,48 @@
+import gc
+import weakref
+
+from game.entity import Pooled, Zombie
+from game.simulation import Simulation
+
+class Thing(Pooled):
+    __slots__ = ("value",)
+    max_free = 2
+
+    def __init__(self, value):
+        self.value = value
+
+class Other(Pooled):
+    __slots__ = ()
+
+def test_pool_reuses_released():
+    thing = Thing.create(1)
+    thing.release()
+    again = Thing.create(2)
+    assert again is thing
+    assert again.value == 2
+    assert Thing.free == []
+
+def test_pool_keeps_at_most_max_free():
+    things = [Thing.create(i) for i in range(3)]
+    for thing in things:
+        thing.release()
+    assert Thing.free == things[:2]
+    Thing.free.clear()
+
+def test_pool_per_class():
+    Thing.create(1).release()
+    assert Other.free == []
+    assert Other.create() is not Thing.free[0]
+    Thing.free.clear()
+
+def test_released_zombie_lets_go_of_its_game():
+    sim = Simulation("level1", "maps/level1_waves.txt", 25, 600, seed=2)
+    zombie = Zombie.create(sim, sim.tmap.starts[0])
+    zombie.release()
+    assert zombie in Zombie.free
+    assert zombie.game == None and zombie.tile == None and zombie.dest == None and zombie.horde == None
+    tmap = weakref.ref(sim.tmap)
+    sim = None
+    gc.collect()
+    assert tmap() == None
+    Zombie.free.remove(zombie)
@@ -0,0 +1,72 @@
+import csv
+import json
+
+import pygame
+
+from game.main import Game
+from game.profiler import Profiler
+
+def profiled(frames, history=600):
+    profiler = Profiler(history)
+    for ms in frames:
+        profiler.start_frame()
+        profiler.frame_start -= ms / 1000
+        profiler.mark("scene")
+        profiler.count("dirty rects", 2)
+        profiler.count("dirty rects")
+    profiler.start_frame()
+    return profiler
+
+def test_frames_kept_with_phases_and_counters():
+    profiler = profiled([10] * 5, history=3)
+    assert len(profiler.frames) == 3
+    assert profiler.columns() == ["frame", "scene", "dirty rects"]
+    assert all(frame["dirty rects"] == 3 for frame in profiler.frames)
+    assert all(frame["frame"] >= 10 for frame in profiler.frames)
+
+def test_percentiles():
+    profiler = profiled(range(100))
+    p50, p95, p99 = profiler.percentiles("frame")
+    assert 50 <= p50 < 51 and 95 <= p95 < 96 and 99 <= p99 < 100
+    assert profiler.percentiles("missing") == [0, 0, 0]
+    assert Profiler().percentiles("frame") == [0, 0, 0]
+
+def test_export(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    profiler = profiled([5, 6, 7])
+    profiler.export()
+    with open(next(tmp_path.glob("profile-*.csv")), newline="") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == profiler.columns()
+    assert len(rows) == 4
+    with open(next(tmp_path.glob("profile-*.json"))) as file:
+        data = json.load(file)
+    assert data["columns"] == profiler.columns()
+    assert len(data["frames"]) == 3
+    assert set(data["summary"]["frame"]) == {"p50", "p95", "p99"}
+
+def press(key):
+    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode="", scancode=0))
+
+def test_hidden_overlay_drawn_over(loop):
+    game = Game(loop.screen, "level1", "maps/level1_waves.txt", 25, 500, seed=2)
+    loop.scene = game
+    loop.musicManager.scene = game.id
+    pygame.event.clear()
+    loop.frame()
+    loop.frame()
+    without = loop.screen.copy()
+
+    press(pygame.K_F3)
+    loop.frame()
+    assert loop.profiler.visible
+    rect = loop.profiler.background.get_rect(topleft=(5, 5))
+    assert rect in loop.dirty_rects
+    assert loop.screen.subsurface(rect).get_at((1, 1)) != without.subsurface(rect).get_at((1, 1))
+
+    press(pygame.K_F3)
+    loop.frame()
+    assert not loop.profiler.visible
+    # nothing on the map moves, so without the overlay the screen's what it was before
+    assert loop.redraw_all
+    assert pygame.image.tostring(loop.screen, "RGB") == pygame.image.tostring(without, "RGB")
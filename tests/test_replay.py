@@ -0,0 +1,35 @@
+import random
+
+import pytest
+
+from game.replay import Replay, play_headless
+from game.simulation import Simulation, TOWER_TYPES, FIXED_TIMESTEP
+
+# plays a level with towers built, upgraded and waves called at random steps
+def record(level, wave_txt_path, seed, steps=2400):
+    sim = Simulation(level, wave_txt_path, 25, 2000, seed=seed)
+    rng = random.Random(seed)
+    spots = [(x, y) for x in range(sim.tmap.xdim) for y in range(sim.tmap.ydim) if sim.tmap.can_build((x, y))]
+    for step in range(steps):
+        if step % 200 == 0:
+            x, y = rng.choice(spots)
+            sim.act(("build", x, y, rng.choice(list(TOWER_TYPES))))
+        if step % 400 == 10:
+            sim.act(("call_next",))
+        if step % 300 == 150 and sim.towers:
+            tower = rng.choice(sim.towers)
+            sim.act(("upgrade", tower.x // sim.tmap.SCALE, tower.y // sim.tmap.SCALE))
+        if step == 1000:
+            sim.act(("unlock",))
+        sim.step(FIXED_TIMESTEP)
+    return Replay.from_simulation(sim)
+
+@pytest.mark.parametrize("level, wave_txt_path", [("level2", "maps/level2_waves.txt"), ("level3", None)])
+def test_replay_plays_out_the_same(level, wave_txt_path, tmp_path):
+    replay = record(level, wave_txt_path, seed=7)
+    assert replay.outcome["zombies"] or replay.outcome["waves_cleared"]
+    loaded = Replay.load(replay.save(str(tmp_path / "replay.json")))
+    assert play_headless(loaded) == replay.outcome
+
+def test_same_seed_same_game():
+    assert record("level4", "maps/level4_waves.txt", 3, 1200).outcome == record("level4", "maps/level4_waves.txt", 3, 1200).outcome
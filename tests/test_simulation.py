@@ -0,0 +1,28 @@
+import game.entity as entity
+from game.simulation import Simulation
+
+def near(a, b, dist):
+    return abs(a[0] - b[0]) <= dist and abs(a[1] - b[1]) <= dist
+
+def test_babies_placed_where_carrier_died():
+    sim = Simulation("level1", "maps/level1_waves.txt", 25, 600, seed=2)
+    carrier = entity.CarryZombie.create(sim, sim.tmap.starts[0])
+    sim.zombies.append(carrier)
+    for _ in range(30):
+        sim.step(1 / 60)
+    carrier.hit(carrier.max_health + 1)
+    babies = [zombie for zombie in sim.zombies if type(zombie) == entity.BabyZombie]
+    assert len(babies) == carrier.spawn_group
+    for baby in babies:
+        # drawn where it spawned straight away, not at the top left until the next step
+        assert near(baby.center_pos(), carrier.center_pos(), entity.SCALE)
+
+def test_summoned_zombies_placed_where_summoner_is():
+    sim = Simulation("level1", "maps/level1_waves.txt", 25, 600, seed=2)
+    summoner = entity.SummonerZombie.create(sim, sim.tmap.starts[0])
+    summoner.update_pos()
+    summoner.last_spawn = 0
+    summoner.behaviour(1 / 60)
+    summoned = sim.zombies[-1]
+    assert type(summoned) == summoner.spawntype
+    assert near(summoned.center_pos(), summoner.center_pos(), entity.SCALE)
@@ -0,0 +1,24 @@
+from collections import OrderedDict
+
+import pytest
+
+import game.utils as utils
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(utils, "TEXT_CACHE_SIZE", 3)
+    monkeypatch.setattr(utils, "_text_cache", OrderedDict())
+    return utils._text_cache
+
+def test_text_cached(cache):
+    first = utils.render_text("wave 1", 16, (255,255,255))
+    assert utils.render_text("wave 1", 16, [255,255,255]) is first
+    assert utils.render_text("wave 1", 16, (0,0,0)) is not first
+    assert utils.render_text("wave 1", 20, (255,255,255)) is not first
+
+def test_text_least_recently_used_dropped(cache):
+    for text in ("a", "b", "c"):
+        utils.render_text(text)
+    utils.render_text("a")
+    utils.render_text("d")
+    assert [key[0] for key in cache] == ["c", "a", "d"]
@@ -0,0 +1,48 @@
+import pytest
+
+import game.load as load
+import game.mapfile as mapfile
+from game.map import TileMap, Road, End, Grass, SHARED_TILES, TILE_IDS
+
+def build(level):
+    return TileMap(*[load.image(filepath) for filepath in mapfile.png_paths(level)])
+
+@pytest.mark.parametrize("level", ["level1", "level4"])
+def test_objects_only_for_tiles_with_state(level):
+    tmap = build(level)
+    for layer in (tmap.map, tmap.blocking):
+        for cell in range(tmap.xdim * tmap.ydim):
+            tile = layer.tile(cell)
+            if type(tile).flyweight:
+                assert cell not in layer.objects
+                assert tile is SHARED_TILES[TILE_IDS[type(tile)]]
+            else:
+                assert layer.objects[cell] is tile
+                assert (tile.x, tile.y) == divmod(cell, tmap.ydim)
+
+def test_setting_tiles():
+    tmap = build("level1")
+    tmap.blocking[0, 0] = Grass(None, None)
+    assert tmap.blocking[0, 0] is SHARED_TILES[TILE_IDS[Grass]]
+    end = End(0, 0)
+    tmap.blocking[0, 0] = end
+    assert tmap.blocking[0, 0] is end
+    tmap.blocking[0, 0] = Grass(None, None)
+    assert 0 not in tmap.blocking.objects
+    assert tmap.blocking[-1, 0] == None and tmap.blocking[tmap.xdim, 0] == None
+
+def test_road_next_made_once():
+    tmap = build("level2")
+    roads = [tile for tile in tmap.blocking.unique_tiles() if isinstance(tile, Road)]
+    assert roads
+    for road in roads:
+        assert road.next is road.next
+    assert Road(0, 0).next == {}
+
+def test_multitiles_only_drawn_from_corners():
+    tmap = build("level4")
+    for layer in (tmap.map, tmap.blocking):
+        multi = set(layer.multitile_cells())
+        for cell in range(tmap.xdim * tmap.ydim):
+            assert layer.drawn(cell) == (cell not in multi or layer.corners[cell] == 1)
+    assert any(tmap.blocking.corners)
@@ -0,0 +1,32 @@
+import pytest
+
+from game.map import Tower, FastTower, SniperTower, StunTower, TOWER_STATS
+
+@pytest.mark.parametrize("towertype", [Tower, FastTower, SniperTower, StunTower])
+def test_stats_follow_level(towertype):
+    tower = towertype(0, 0)
+    levels = 0
+    while True:
+        for stat in TOWER_STATS:
+            if hasattr(towertype, stat):
+                assert getattr(tower, stat) == getattr(towertype, stat)[tower.lvl]
+        levels += 1
+        if tower.is_max_level():
+            break
+        tower.upgrade()
+    assert levels == tower.max_level == len(towertype.damage)
+    tower.upgrade()
+    assert tower.lvl == levels - 1
+
+def test_table_made_once_per_class():
+    assert Tower.stat_table() is Tower(0, 0).stat_table()
+    assert FastTower.stat_table() is not Tower.stat_table()
+    assert FastTower.stat_table()[0]["damage"] == FastTower.damage[0]
+    assert "stun_duration" in StunTower.stat_table()[0]
+    assert "stun_duration" not in Tower.stat_table()[0]
+
+def test_class_lists_left_alone():
+    tower = SniperTower(0, 0)
+    tower.upgrade()
+    assert SniperTower.damage == [200, 300]
+    assert SniperTower(0, 0).damage == 200
@@ -0,0 +1,27 @@
+import random
+
+from game.entity import ZombieGrid
+
+# just what the grid looks at
+class Dummy:
+    def __init__(self, pos, dead=False):
+        self.pos = pos
+        self.dead = dead
+
+    def center_pos(self):
+        return self.pos
+
+    def is_dead(self):
+        return self.dead
+
+def test_grid_query_matches_full_scan():
+    rng = random.Random(4)
+    zombies = [Dummy([rng.uniform(-50, 1000), rng.uniform(-50, 600)], rng.random() < 0.1) for _ in range(500)]
+    grid = ZombieGrid()
+    grid.rebuild(zombies)
+    for _ in range(50):
+        pos = [rng.uniform(0, 1000), rng.uniform(0, 600)]
+        radius = rng.uniform(10, 300)
+        expected = [z for z in zombies if not z.dead and (z.pos[0] - pos[0]) ** 2 + (z.pos[1] - pos[1]) ** 2 <= radius ** 2]
+        # same order as the list, so targeting ties go the same way
+        assert grid.query(pos, radius) == expected